@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the annotation of sitemap entries by iter_annotated with treebeard's
+get_annotated_list_qs on synthetic trees. No database is involved.
+
+Usage: python -m benchmarks.annotation [SIZE ...]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import sys
+
+from .utils import setup_django, timeit
+
+
+class Node(object):
+    def __init__(self, path):
+        self.path = path
+
+    def get_depth(self):
+        return len(self.path) // 4
+
+
+def get_nodes(size, branching=10):
+    """
+    Returns ``size`` nodes of a tree where each node has at most ``branching``
+    children, in tree order.
+    """
+    nodes = []
+
+    def add_children(path, remaining):
+        for i in range(1, branching + 1):
+            if not remaining:
+                return
+            child = Node("{0}{1:04d}".format(path, i))
+            nodes.append(child)
+            remaining -= 1
+        return remaining
+
+    parents = [""]
+    remaining = size
+    while remaining:
+        level = []
+        for parent in parents:
+            start = len(nodes)
+            remaining = add_children(parent, remaining) or 0
+            level.extend(node.path for node in nodes[start:])
+            if not remaining:
+                break
+        parents = level
+    return sorted(nodes, key=lambda node: node.path)
+
+
+def main(sizes):
+    setup_django(database=False)
+
+    from treebeard.models import Node as TreebeardNode
+
+    from djangocms_htmlsitemap.tree import iter_annotated
+
+    for size in sizes:
+        nodes = get_nodes(size)
+        treebeard = timeit(lambda: TreebeardNode.get_annotated_list_qs(nodes))
+        generator = timeit(
+            lambda: list(iter_annotated((node, node.path) for node in nodes))
+        )
+        print(
+            "{0:>7} nodes: get_annotated_list_qs {1:8.2f} ms, "
+            "iter_annotated {2:8.2f} ms".format(size, treebeard, generator)
+        )
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [1000, 10000, 50000])
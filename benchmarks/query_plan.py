@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the query plans and execution times of the sitemap page query with
+the previous one, which relied on a DISTINCT over a join with the titles.
+
+Usage: python -m benchmarks.query_plan [SIZE ...]
+
+The test settings (SQLite) are used by default; set DJANGO_SETTINGS_MODULE to
+benchmark against another database, e.g. PostgreSQL which reports plan costs.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import sys
+
+from .utils import SHAPES, build_tree, setup_django, timeit
+
+
+def get_distinct_pages(site, language):
+    from cms.models import Page
+
+    from djangocms_htmlsitemap.tree import PATH_COLUMN, tree_provider
+
+    pages = (
+        Page.objects.public()
+        .published(site=site)
+        .order_by(PATH_COLUMN)
+        .filter(login_required=False)
+        .filter(title_set__language=language)
+        .distinct()
+    )
+    return tree_provider.select_nodes(pages)
+
+
+def main(sizes):
+    setup_django()
+
+    from django.contrib.sites.models import Site
+
+    from djangocms_htmlsitemap.tree import get_published_pages
+
+    site = Site.objects.get_current()
+    strategies = [("distinct", get_distinct_pages), ("semi-join", get_published_pages)]
+
+    for size in sizes:
+        build_tree(size, **SHAPES["multilingual"])
+        print("=== {0} pages".format(size))
+        for name, get_pages in strategies:
+            pages = get_pages(site, "en")
+            duration = timeit(lambda: list(pages.all()))
+            print("--- {0}: {1:.2f} ms".format(name, duration))
+            print(pages.explain())
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [100, 500, 1000])
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the rendering of the HTML sitemap plugin (including its template) on
+synthetic page trees of various shapes and sizes: execution time with a cold
+and a warm cache, number of SQL queries and peak memory usage.
+
+Usage: python -m benchmarks.render [--shape SHAPE ...] [--size SIZE ...]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import tracemalloc
+
+from .utils import SHAPES, build_tree, setup_django, timeit
+
+SIZES = [100, 1000, 10000, 50000]
+
+
+def get_renderer():
+    from django.core.cache import cache
+    from django.db import connection
+    from django.template import RequestContext
+    from django.test.client import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+
+    from cms.api import add_plugin
+    from cms.models import Placeholder
+    from cms.plugin_rendering import ContentRenderer
+
+    from djangocms_htmlsitemap.cms_plugins import HtmlSitemapPlugin
+
+    request = RequestFactory().get("/")
+    request.LANGUAGE_CODE = "en"
+    request.current_page = None
+    placeholder = Placeholder.objects.create(slot="benchmark")
+    instance = add_plugin(placeholder, HtmlSitemapPlugin, "en")
+
+    def render(clear_cache=True):
+        if clear_cache:
+            cache.clear()
+        context = RequestContext(request, {"request": request})
+        return ContentRenderer(request=request).render_plugin(instance, context)
+
+    def count_queries():
+        with CaptureQueriesContext(connection) as queries:
+            render()
+        return len(queries)
+
+    return render, count_queries
+
+
+def measure_peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(shapes, sizes, repeat):
+    setup_django()
+    render, count_queries = get_renderer()
+
+    print(
+        "{0:<14}{1:>8}{2:>12}{3:>12}{4:>10}{5:>12}".format(
+            "shape", "pages", "cold (ms)", "warm (ms)", "queries", "peak (KiB)"
+        )
+    )
+    for shape in shapes:
+        for size in sizes:
+            build_tree(size, **SHAPES[shape])
+            render()
+            print(
+                "{0:<14}{1:>8}{2:>12.1f}{3:>12.1f}{4:>10}{5:>12.0f}".format(
+                    shape,
+                    size,
+                    timeit(render, repeat),
+                    timeit(lambda: render(clear_cache=False), repeat),
+                    count_queries(),
+                    measure_peak_memory(render) / 1024.0,
+                )
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shape", action="append", choices=sorted(SHAPES))
+    parser.add_argument("--size", action="append", type=int)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.shape or sorted(SHAPES), args.size or SIZES, args.repeat)
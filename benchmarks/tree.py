@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the tree provider on synthetic page trees: reading the page tree of a
+site (number of SQL queries and execution time) and slicing it into annotated
+sitemap entries. Run it with each version of django CMS (see the bench
+environments of tox) to compare both layouts of the page tree.
+
+Usage: python -m benchmarks.tree [--shape SHAPE ...] [--size SIZE ...]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+
+from .utils import SHAPES, build_tree, setup_django, timeit
+
+SIZES = [100, 1000, 10000]
+
+
+def main(shapes, sizes, repeat):
+    setup_django()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from cms import __version__
+
+    from djangocms_htmlsitemap.engine import get_page_tree, slice_page_tree
+    from djangocms_htmlsitemap.models import HtmlSitemapPluginConf
+    from djangocms_htmlsitemap.tree import tree_provider
+
+    instance = HtmlSitemapPluginConf()
+
+    print(
+        "django CMS {0}, tree nodes: {1}".format(
+            __version__, tree_provider.node_model.__name__
+        )
+    )
+    print(
+        "{0:<14}{1:>8}{2:>10}{3:>12}{4:>12}".format(
+            "shape", "pages", "queries", "read (ms)", "slice (ms)"
+        )
+    )
+    for shape in shapes:
+        for size in sizes:
+            build_tree(size, **SHAPES[shape])
+            with CaptureQueriesContext(connection) as queries:
+                tree = get_page_tree(settings.SITE_ID, "en")
+            print(
+                "{0:<14}{1:>8}{2:>10}{3:>12.1f}{4:>12.1f}".format(
+                    shape,
+                    size,
+                    len(queries),
+                    timeit(lambda: get_page_tree(settings.SITE_ID, "en"), repeat),
+                    timeit(lambda: slice_page_tree(tree, instance), repeat),
+                )
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shape", action="append", choices=sorted(SHAPES))
+    parser.add_argument("--size", action="append", type=int)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.shape or sorted(SHAPES), args.size or SIZES, args.repeat)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, unicode_literals
+
+import os
+import random
+import time
+from collections import deque
+
+# Shapes of the synthetic page trees used by the benchmarks.
+SHAPES = {
+    # Few levels with many pages on each of them.
+    "wide": {"branching": 100},
+    # Many levels with few pages on each of them.
+    "deep": {"branching": 2},
+    # Every page is translated in all the configured languages.
+    "multilingual": {"branching": 10, "all_languages": True},
+    # Some pages are hidden from the navigation or require a login.
+    "mixed": {"branching": 10, "not_in_navigation": 0.3, "login_required": 0.1},
+}
+
+
+def setup_django(database=True):
+    """
+    Configures Django (using the test settings unless DJANGO_SETTINGS_MODULE is
+    set) and creates a fresh test database if required.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+
+    import django
+
+    django.setup()
+    if not database:
+        return
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def clear_tree():
+    """
+    Removes all the pages from the database, bypassing signals.
+    """
+    from django.db import connection
+
+    from cms.models import Page, Title
+
+    from djangocms_htmlsitemap.models import HtmlSitemapSnapshotEntry
+    from djangocms_htmlsitemap.tree import TreeNode
+
+    models = [HtmlSitemapSnapshotEntry, Title, Page]
+    if TreeNode is not Page:
+        models.append(TreeNode)
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute("DELETE FROM {0}".format(model._meta.db_table))
+
+
+def build_tree(
+    size,
+    branching=10,
+    all_languages=False,
+    not_in_navigation=0.0,
+    login_required=0.0,
+    seed=0,
+):
+    """
+    Replaces the page tree of the current site with ``size`` published pages.
+    Pages are added breadth-first, each page having at most ``branching``
+    children. Only the public versions of the pages are created, using bulk
+    inserts so that large trees can be built in a few seconds. Pages are the
+    nodes of the tree themselves with django CMS < 3.5.
+    """
+    from django.conf import settings
+    from django.utils import timezone
+
+    from cms.models import Page, Title
+
+    from djangocms_htmlsitemap.tree import TreeNode
+
+    clear_tree()
+    shared_nodes = TreeNode is not Page
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    languages = [code for code, name in settings.LANGUAGES]
+    if not all_languages:
+        languages = languages[:1]
+
+    nodes, pages, titles = [], [], []
+    queue = deque([(None, 0, "")])
+    while queue and len(nodes) < size:
+        parent, depth, parent_url = queue.popleft()
+        for position in range(1, (branching if parent else 1) + 1):
+            if len(nodes) >= size:
+                break
+            pk = len(nodes) + 1
+            node_fields = dict(
+                path=TreeNode._get_path(
+                    parent.path if parent else None, depth + 1, position
+                ),
+                depth=depth + 1,
+                numchild=0,
+                parent=parent,
+                site_id=settings.SITE_ID,
+            )
+            page_fields = dict(
+                publisher_is_draft=False,
+                is_home=parent is None,
+                in_navigation=rng.random() >= not_in_navigation,
+                login_required=rng.random() < login_required,
+                template="simple.html",
+                created_by="benchmark",
+                changed_by="benchmark",
+                creation_date=now,
+                changed_date=now,
+                publication_date=now,
+                languages=",".join(languages),
+            )
+            if shared_nodes:
+                node = TreeNode(pk=pk, **node_fields)
+                pages.append(Page(pk=pk, node_id=pk, **page_fields))
+            else:
+                node = Page(pk=pk, **dict(node_fields, **page_fields))
+                pages.append(node)
+            if parent:
+                parent.numchild += 1
+            nodes.append(node)
+            slug = "page-{0}".format(pk)
+            url = "{0}/{1}".format(parent_url, slug).lstrip("/") if parent else ""
+            for language in languages:
+                titles.append(
+                    Title(
+                        page_id=pk,
+                        language=language,
+                        title="Page {0} ({1})".format(pk, language),
+                        slug=slug,
+                        path=url,
+                        published=True,
+                        publisher_is_draft=False,
+                    )
+                )
+            queue.append((node, depth + 1, url))
+
+    if shared_nodes:
+        TreeNode.objects.bulk_create(nodes, batch_size=500)
+    Page.objects.bulk_create(pages, batch_size=500)
+    Title.objects.bulk_create(titles, batch_size=500)
+
+
+def timeit(func, repeat=5):
+    """
+    Returns the best execution time of the given function, in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+    return min(timings) * 1000
@@ -1,2 +1,4 @@
 # -*- coding: utf-8 -*-
 __version__ = "0.6.0"
+
+default_app_config = "djangocms_htmlsitemap.apps.HtmlSitemapConfig"
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.apps import AppConfig
+from django.utils.translation import ugettext_lazy as _
+
+
+class HtmlSitemapConfig(AppConfig):
+    name = "djangocms_htmlsitemap"
+    verbose_name = _("HTML Sitemap")
+
+    def ready(self):
+        from . import receivers  # noqa: F401
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from .conf import settings
+
+
+def get_cache():
+    return caches[settings.CACHE_BACKEND]
+
+
+def get_tree_version_key(site_id):
+    return "djangocms_htmlsitemap:version:{0}".format(site_id)
+
+
+def get_tree_modified_key(site_id):
+    return "djangocms_htmlsitemap:modified:{0}".format(site_id)
+
+
+def get_structure_version_key(site_id):
+    return "djangocms_htmlsitemap:structure:{0}".format(site_id)
+
+
+def get_branch_version_key(site_id, branch_id):
+    return "djangocms_htmlsitemap:branch:{0}:{1}".format(site_id, branch_id)
+
+
+def get_branch_cache_key(
+    site_id, language, structure_version, branch_id="", branch_version=""
+):
+    return "djangocms_htmlsitemap:branch_tree:{0}:{1}:{2}:{3}:{4}".format(
+        site_id, language, structure_version, branch_id, branch_version
+    )
+
+
+def get_sitemap_cache_key(
+    instance, site_id, language, section_path=None, fingerprint=None, kind="sitemap"
+):
+    return "djangocms_htmlsitemap:{0}:{1}:{2}:{3}:{4}:{5}:{6}:{7}:{8}:{9}:{10}".format(
+        kind,
+        instance.pk,
+        site_id,
+        language,
+        instance.min_depth,
+        instance.max_depth,
+        instance.in_navigation,
+        instance.lazy_levels,
+        instance.root_page_id,
+        section_path,
+        fingerprint,
+    )
+
+
+def bump_tree_version(site_id):
+    """
+    Invalidates all the sitemaps cached for the given site by assigning a new
+    version to its page tree. The date of the change is recorded as well (see
+    ``get_tree_modified``).
+    """
+    get_cache().set_many(
+        {
+            get_tree_version_key(site_id): uuid4().hex,
+            get_tree_modified_key(site_id): timezone.now(),
+        },
+        None,
+    )
+
+
+def get_tree_version(site_id):
+    """
+    Returns the current version of the page tree of the given site.
+    """
+    version = get_cache().get(get_tree_version_key(site_id))
+    return version if version is not None else create_tree_version(site_id)
+
+
+def get_tree_modified(site_id):
+    """
+    Returns the date of the latest change of the page tree of the given site,
+    or ``None`` if it is unknown.
+    """
+    return get_cache().get(get_tree_modified_key(site_id))
+
+
+def create_tree_version(site_id):
+    cache = get_cache()
+    version = uuid4().hex
+    if not cache.add(get_tree_version_key(site_id), version, None):
+        version = cache.get(get_tree_version_key(site_id), version)
+    return version
+
+
+def bump_structure_version(site_id):
+    """
+    Invalidates all the branches of the page tree of the given site cached by
+    ``get_branch_page_tree``.
+    """
+    get_cache().set(get_structure_version_key(site_id), uuid4().hex, None)
+
+
+def bump_branch_version(site_id, branch_id):
+    """
+    Invalidates the branch of the page tree of the given site rooted at the
+    tree node with the given ID.
+    """
+    get_cache().set(get_branch_version_key(site_id, branch_id), uuid4().hex, None)
+
+
+def get_branch_versions(site_id, branch_ids):
+    """
+    Returns a ``(structure_version, branch_versions)`` tuple where
+    ``branch_versions`` is a dictionary of the current versions of the
+    branches of the page tree of a site rooted at the tree nodes with the
+    given IDs. All the versions are fetched using a single cache lookup.
+    """
+    cache = get_cache()
+    keys = {get_branch_version_key(site_id, pk): pk for pk in branch_ids}
+    structure_key = get_structure_version_key(site_id)
+    values = cache.get_many([structure_key] + list(keys))
+
+    versions = {}
+    for key in [structure_key] + list(keys):
+        version = values.get(key)
+        if version is None:
+            version = uuid4().hex
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions[key] = version
+    return (
+        versions[structure_key],
+        {pk: versions[key] for key, pk in keys.items()},
+    )
+
+
+def get_cached_sitemap(
+    instance, site_id, language, section_path=None, fingerprint=None, kind="sitemap"
+):
+    """
+    Returns a ``(version, sitemap)`` tuple where ``version`` is the current
+    version of the page tree of the given site and ``sitemap`` the value cached
+    for the given plugin instance (and section, see ``get_section_path``, and
+    permissions, see ``get_permission_fingerprint``), or ``None`` if there is
+    no up-to-date value. Both values are fetched using a single cache lookup.
+
+    The entries of sitemaps are cached as ``"sitemap"`` values while their
+    rendered HTML fragments (see ``views.sitemap``) are cached as
+    ``"fragment"`` values.
+    """
+    cache = get_cache()
+    version_key = get_tree_version_key(site_id)
+    sitemap_key = get_sitemap_cache_key(
+        instance, site_id, language, section_path, fingerprint, kind
+    )
+    values = cache.get_many([version_key, sitemap_key])
+
+    version = values.get(version_key)
+    if version is None:
+        return create_tree_version(site_id), None
+
+    cached_version, sitemap = values.get(sitemap_key, (None, None))
+    return version, sitemap if cached_version == version else None
+
+
+def set_cached_sitemap(
+    instance,
+    site_id,
+    language,
+    version,
+    sitemap,
+    section_path=None,
+    fingerprint=None,
+    kind="sitemap",
+):
+    """
+    Stores the sitemap computed for the given plugin instance and version of
+    the page tree.
+    """
+    get_cache().set(
+        get_sitemap_cache_key(
+            instance, site_id, language, section_path, fingerprint, kind
+        ),
+        (version, sitemap),
+        settings.CACHE_TIMEOUT,
+    )
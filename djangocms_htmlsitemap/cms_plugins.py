@@ -3,21 +3,42 @@
 from __future__ import unicode_literals
 
 from django.contrib.sites.models import Site
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 
-from cms.models.pagemodel import Page
 from cms.plugin_base import CMSPluginBase
 from cms.plugin_pool import plugin_pool
 
-from .compat import DJANGO_CMS_35
+from .cache import get_cached_sitemap, set_cached_sitemap
+from .conf import settings
+from .engine import (
+    get_annotated_entries,
+    get_menu_page_paths,
+    get_menu_page_tree,
+    get_request_page_tree,
+    get_root_path,
+    get_section_path,
+    slice_page_tree,
+)
+from .instrumentation import MeasuredTemplate, collect, start_metrics
 from .models import HtmlSitemapPluginConf
+from .permissions import get_permission_fingerprint
+from .prebuilding import can_prebuild, read_static_sitemap
+from .rendering import (
+    SITEMAP_TEMPLATE,
+    FastSitemapTemplate,
+    StaticSitemapTemplate,
+    can_render_fast,
+)
+from .tree import AnnotatedEntries, get_entry_list
 
 
 class HtmlSitemapPlugin(CMSPluginBase):
     model = HtmlSitemapPluginConf
     name = _("HTML Sitemap")
 
-    render_template = "djangocms_htmlsitemap/sitemap.html"
+    render_template = SITEMAP_TEMPLATE
 
     def render(self, context, instance, placeholder):
         request = context["request"]
@@ -25,40 +46,136 @@ class HtmlSitemapPlugin(CMSPluginBase):
 
         site = Site.objects.get_current()
 
-        path_column = "node__path" if DJANGO_CMS_35 else "path"
-        node_column = "node__depth" if DJANGO_CMS_35 else "depth"
+        context.update(self.get_sitemap_context(request, instance, site, language))
+        return context
 
-        pages = (
-            Page.objects.public()
-            .published(site=site)
-            .order_by(path_column)
-            .filter(login_required=False, **{node_column + "__gte": instance.min_depth})
-            .filter(title_set__language=language)
-            .distinct()
+    def get_sitemap_context(self, request, instance, site, language):
+        metrics = start_metrics(instance, site.pk, language)
+        with collect(metrics):
+            static_html = self.get_static_sitemap(instance, site, language)
+            if static_html is not None:
+                if metrics is not None:
+                    metrics.cache_hit = True
+                pages = []
+            elif settings.MENU_NODES:
+                # The menu nodes are already cached by django CMS.
+                tree = get_menu_page_tree(request)
+                root_path = get_root_path(
+                    instance, request, get_menu_page_paths(request)
+                )
+                pages = (
+                    get_entry_list(slice_page_tree(tree, instance, root_path))
+                    if root_path is not False
+                    else []
+                )
+            else:
+                pages = self.get_cached_entries(
+                    request, instance, site, language, metrics
+                )
+
+        # Annotated entries are their own info: both variables share the list
+        # of entries.
+        return {
+            "instance": instance,
+            "pages": pages,
+            "annotated_pages": AnnotatedEntries(pages),
+            "htmlsitemap_metrics": metrics,
+            "htmlsitemap_static_html": static_html,
+        }
+
+    def render_fragment(self, request, instance, site, language):
+        """
+        Renders the HTML fragment of the sitemap of the given instance outside
+        of any page, exactly as it is embedded in pages.
+        """
+        context = self.get_sitemap_context(request, instance, site, language)
+        context["request"] = request
+        template = self.get_render_template(context, instance, None)
+        return template.render(context, request)
+
+    def get_cache_expiration(self, request, instance, placeholder):
+        # Sitemaps depending on the user must not be shared through the
+        # placeholder cache of django CMS, which is used for all the users
+        # but the staff. Neither must sitemaps depending on the current page,
+        # as a placeholder is only cached once for all the pages displaying
+        # it (eg. static placeholders).
+        if settings.VIEW_PERMISSIONS or settings.MENU_NODES:
+            return 0
+        if instance.section_depth and not instance.root_page_id:
+            return 0
+        return None
+
+    def get_static_sitemap(self, instance, site, language):
+        # Pre-built sitemaps are rendered with the default template from the
+        # page tree, which differs from the menu nodes, and are the same for
+        # all the users.
+        if (
+            not settings.STATIC_DIR
+            or settings.MENU_NODES
+            or settings.VIEW_PERMISSIONS
+            or self.render_template != SITEMAP_TEMPLATE
+            or not can_prebuild(instance)
+        ):
+            return None
+        html = read_static_sitemap(instance, site.pk, language)
+        return mark_safe(html) if html is not None else None
+
+    def get_cached_entries(self, request, instance, site, language, metrics=None):
+        section_path = None
+        if not instance.root_page_id:
+            section_path = get_section_path(instance, request)
+        fingerprint = None
+        if settings.VIEW_PERMISSIONS:
+            fingerprint = get_permission_fingerprint(request.user, site)
+
+        version, pages = get_cached_sitemap(
+            instance, site.pk, language, section_path, fingerprint
         )
-
-        if instance.max_depth:
-            pages = pages.filter(**{node_column + "__lte": instance.max_depth})
-        if instance.in_navigation is not None:
-            pages = pages.filter(in_navigation=instance.in_navigation)
-
-        context["instance"] = instance
-        context["pages"] = pages
-
-        if DJANGO_CMS_35:
-            from cms.models.pagemodel import TreeNode
-
-            nodes = [page.node for page in pages.select_related("node")]
-            annotated_nodes = TreeNode.get_annotated_list_qs(nodes)
-            annotated_pages = [
-                (pages[x], annotated_nodes[x][1]) for x in range(0, len(nodes))
-            ]
+        if metrics is not None:
+            metrics.cache_hit = pages is not None
+        if pages is None:
+            pages = get_entry_list(
+                self.get_entries(request, instance, site, language, version)
+            )
+            set_cached_sitemap(
+                instance, site.pk, language, version, pages, section_path, fingerprint
+            )
+        return pages
+
+    def get_entries(self, request, instance, site, language, version):
+        root_path = get_root_path(instance, request)
+        if root_path is False:
+            return []
+        # Sitemaps listing a branch only read this branch from the database,
+        # unless the whole tree has already been loaded during the request.
+        # Permissions are only checked on whole trees.
+        tree = get_request_page_tree(
+            request,
+            site,
+            language,
+            version,
+            load=root_path is None or settings.VIEW_PERMISSIONS,
+        )
+        if tree is None:
+            return get_annotated_entries(instance, site, language, root_path)
+        return slice_page_tree(tree, instance, root_path)
+
+    def get_render_template(self, context, instance, placeholder):
+        static_html = context.get("htmlsitemap_static_html")
+        if static_html is not None:
+            template = StaticSitemapTemplate(static_html)
+        elif self.render_template == SITEMAP_TEMPLATE and can_render_fast(
+            SITEMAP_TEMPLATE
+        ):
+            template = FastSitemapTemplate()
         else:
-            annotated_pages = Page.get_annotated_list_qs(pages)
+            template = get_template(self.render_template)
 
-        context["annotated_pages"] = annotated_pages
-
-        return context
+        metrics = context.get("htmlsitemap_metrics")
+        if metrics is None:
+            return template
+        # The rendering of the template is part of the collected metrics.
+        return MeasuredTemplate(template, metrics)
 
 
 plugin_pool.register_plugin(HtmlSitemapPlugin)
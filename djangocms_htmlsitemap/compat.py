@@ -1,7 +1,49 @@
+from contextlib import contextmanager
 from distutils.version import LooseVersion
 
+from django import VERSION as DJANGO_VERSION
+from django.db import connection
+
 import cms
 
+try:
+    from cms.cms_menus import get_visible_nodes
+except ImportError:  # pragma: no cover
+    from cms.cms_menus import get_visible_pages
+
+    def get_visible_nodes(request, pages, site):
+        visible_ids = set(get_visible_pages(request, pages, site))
+        return [page for page in pages if page.pk in visible_ids]
+
 DJANGO_CMS_VERSION = LooseVersion(cms.__version__)
 
 DJANGO_CMS_35 = DJANGO_CMS_VERSION >= LooseVersion("3.5")
+
+CAN_WRAP_QUERIES = DJANGO_VERSION >= (2, 0)
+
+
+def get_page_site_id(page):
+    return page.node.site_id if DJANGO_CMS_35 else page.site_id
+
+
+def iterate(queryset, chunk_size):
+    """
+    Iterates over the given queryset without caching its results, fetching
+    rows from the database by chunks when supported.
+    """
+    if DJANGO_VERSION >= (2, 0):
+        return queryset.iterator(chunk_size=chunk_size)
+    return queryset.iterator()  # pragma: no cover
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """
+    Installs the given wrapper around the SQL queries run on the default
+    database connection, when supported.
+    """
+    if not CAN_WRAP_QUERIES:  # pragma: no cover
+        yield
+        return
+    with connection.execute_wrapper(wrapper):
+        yield
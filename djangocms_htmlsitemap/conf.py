@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.conf import settings as django_settings
+
+
+DEFAULTS = {
+    # Name of the cache (as defined in the CACHES setting) used to store sitemaps.
+    "CACHE_BACKEND": "default",
+    # Number of seconds during which a computed sitemap is kept in the cache. A
+    # value of 0 disables the cache.
+    "CACHE_TIMEOUT": 60 * 60,
+    # How the cached sitemaps are recomputed once a change of the page tree is
+    # committed: "thread" recomputes them in a background thread, "sync"
+    # recomputes them in the current thread (mostly useful in tests) and None
+    # leaves them to the next rendering.
+    "PREWARM": None,
+    # Whether sitemaps are read from the precomputed snapshot table, which is
+    # refreshed when pages are published, unpublished or moved.
+    "SNAPSHOTS": False,
+    # Whether sitemaps are built from the nodes of the django CMS menu, which
+    # are cached by django CMS, rather than from the pages. Takes precedence
+    # over SNAPSHOTS.
+    "MENU_NODES": False,
+    # Value of the max-age directive of the Cache-Control header sent with
+    # sitemap fragments. No Cache-Control header is sent if None.
+    "FRAGMENT_MAX_AGE": None,
+    # Number of pages fetched at once when a sitemap is streamed.
+    "STREAM_CHUNK_SIZE": 500,
+    # Whether sitemaps are rendered by a pure Python renderer producing the
+    # same markup as the templates of the application. The templates are still
+    # used if they are overridden by the project.
+    "FAST_RENDERER": False,
+    # Dotted path of the class receiving the metrics collected while sitemaps
+    # are rendered, eg. "djangocms_htmlsitemap.instrumentation.InMemoryMetricsBackend".
+    # Metrics are only collected if a backend is set or if a receiver is
+    # connected to the sitemap_rendered signal.
+    "METRICS_BACKEND": None,
+    # Whether sitemaps list the pages that the current user can view according
+    # to the permissions of django CMS, including the pages requiring a login.
+    # Sitemaps are cached once for all the users sharing the same groups.
+    # Requires the authentication middleware.
+    "VIEW_PERMISSIONS": False,
+    # Depth of the pages rooting the branches of the page tree which are cached
+    # separately, so that publishing a page only reads its branch from the
+    # database again, eg. 2 for the children of a home page at the root of the
+    # tree. Disabled if None.
+    "BRANCH_DEPTH": None,
+    # Directory in which the build_htmlsitemaps command writes pre-rendered
+    # sitemaps. The plugin serves them until the page tree of their site
+    # changes. Disabled if None.
+    "STATIC_DIR": None,
+}
+
+
+class Settings(object):
+    """
+    Gives access to the settings of the application. Each setting can be
+    overridden in the project settings using the ``HTMLSITEMAP_`` prefix.
+    """
+
+    def __getattr__(self, name):
+        if name not in DEFAULTS:
+            raise AttributeError(name)
+        return getattr(django_settings, "HTMLSITEMAP_" + name, DEFAULTS[name])
+
+
+settings = Settings()
@@ -0,0 +1,594 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import Max, Q
+from django.urls import NoReverseMatch, reverse
+
+from cms.models.pagemodel import Page
+from menus.menu_pool import menu_pool
+
+from .cache import (
+    get_branch_cache_key,
+    get_branch_versions,
+    get_cache,
+    get_tree_modified,
+)
+from .compat import get_visible_nodes
+from .conf import settings
+from .instrumentation import count_rows, measure
+from .snapshots import annotate_snapshot_entries, get_snapshot_entries
+from .tree import (
+    DEPTH_COLUMN,
+    PATH_COLUMN,
+    SITE_COLUMN,
+    SitemapEntry,
+    TreeNode,
+    annotate_page_entries,
+    filter_for_instance,
+    filter_for_root,
+    get_entries,
+    get_node,
+    get_page_url,
+    get_published_pages,
+    get_published_titles,
+    iter_annotated_entries,
+    tree_provider,
+)
+
+
+def get_annotated_entries(instance, site, language, root_path=None):
+    """
+    Returns a list of ``(entry, info)`` tuples describing the pages to display
+    in the sitemap of the given plugin instance. If a tree path is given, only
+    the descendants of the corresponding node are considered.
+
+    When the plugin instance only renders a limited number of levels at once,
+    the ``info`` of the last rendered entries having listed descendants hold
+    the URL of the fragment displaying their subtree (see ``split_levels``).
+    """
+    if settings.SNAPSHOTS:
+        queryset = get_snapshot_entries(site=site, language=language)
+        path_column, depth_column = "path", "depth"
+        annotate = annotate_snapshot_entries
+    else:
+        queryset = get_published_pages(site, language)
+        path_column, depth_column = PATH_COLUMN, DEPTH_COLUMN
+
+        def annotate(pages):
+            return annotate_page_entries(pages, language)
+
+    queryset = filter_for_instance(queryset, instance, depth_column)
+
+    parent_depth = 0
+    if root_path:
+        parent_depth = len(root_path) // TreeNode.steplen
+        queryset = filter_for_root(queryset, root_path, path_column, depth_column)
+
+    last_depth = get_last_depth(instance, parent_depth)
+    if last_depth is None:
+        return annotate(queryset)
+
+    with measure("query"):
+        paths = queryset.values_list(path_column, flat=True)
+        rendered_paths, parent_paths = split_levels(
+            ((path, path) for path in paths), instance.lazy_levels
+        )
+    # The pages down to the last depth are always rendered, deeper ones only
+    # if some of their ancestors are not listed.
+    deeper_paths = [
+        path for path in rendered_paths if len(path) > TreeNode.steplen * last_depth
+    ]
+    queryset = queryset.filter(
+        Q(**{depth_column + "__lte": last_depth})
+        | Q(**{path_column + "__in": deeper_paths})
+    )
+    annotated_entries = annotate(queryset)
+    add_subtree_urls(annotated_entries, instance, parent_paths)
+    return annotated_entries
+
+
+def get_last_depth(instance, parent_depth=0):
+    """
+    Returns the depth down to which all the pages listed by the given plugin
+    instance below a node of the given depth are rendered at once, or
+    ``None`` if all the levels are rendered. All the levels are rendered when
+    deeper ones could not be loaded on demand (see ``can_load_subtrees``).
+    """
+    if not instance.lazy_levels or not can_load_subtrees():
+        return None
+    last_depth = max(instance.min_depth, parent_depth + 1) + instance.lazy_levels - 1
+    if instance.max_depth and last_depth >= instance.max_depth:
+        return None
+    return last_depth
+
+
+def can_load_subtrees():
+    """
+    Returns whether the fragments displaying the subtrees of sitemaps can be
+    requested, that is whether the project includes the URLs of the
+    application.
+    """
+    try:
+        reverse("djangocms_htmlsitemap:subtree", args=[0, "0001"])
+    except NoReverseMatch:
+        return False
+    return True
+
+
+def split_levels(items, levels):
+    """
+    Splits an iterable of ``(obj, path)`` tuples ordered by tree path
+    according to the nesting levels of the items (see ``iter_nesting``).
+    Returns a ``(rendered, parent_paths)`` tuple where ``rendered`` is the
+    list of the objects of the given number of first levels and
+    ``parent_paths`` the set of the paths of the rendered items having
+    descendants at the next level.
+
+    An item is nested under its closest listed ancestor, so the items listed
+    below pages that are filtered out (eg. pages that are not in navigation)
+    are rendered as soon as their level is reached, whatever their depth.
+    """
+    rendered = []
+    parent_paths = set()
+    # Paths of the rendered ancestors of the current item.
+    stack = []
+    for obj, path in items:
+        while stack and not path.startswith(stack[-1]):
+            stack.pop()
+        if len(stack) < levels:
+            rendered.append(obj)
+            stack.append(path)
+        else:
+            parent_paths.add(stack[-1])
+    return rendered, parent_paths
+
+
+def add_subtree_urls(annotated_entries, instance, parent_paths):
+    for entry, info in annotated_entries:
+        if entry.path in parent_paths:
+            info.subtree_url = reverse(
+                "djangocms_htmlsitemap:subtree", args=[instance.pk, entry.path]
+            )
+
+
+def get_page_tree(site, language):
+    """
+    Returns a list of ``(url, title, path, depth, in_navigation)`` tuples
+    describing all the pages which can be displayed in the sitemaps of the
+    given site and language, ordered by path.
+    """
+    site_id = getattr(site, "pk", site)
+    if settings.BRANCH_DEPTH and settings.CACHE_TIMEOUT:
+        return get_branch_page_tree(site_id, language)
+    return get_page_trees([(site_id, language)])[site_id, language]
+
+
+def get_page_trees(sites_languages, path_prefix=None):
+    """
+    Returns a dictionary of page trees, as returned by ``get_page_tree``, keyed
+    by the given ``(site_id, language)`` tuples. All the trees are built from
+    a single query ordered by site, language and path. If a path prefix is
+    given, only the pages whose path starts with it are considered.
+    """
+    trees = {key: [] for key in sites_languages}
+    if not trees:
+        return trees
+    site_ids = {site_id for site_id, language in trees}
+    languages = {language for site_id, language in trees}
+
+    if settings.SNAPSHOTS:
+        entries = get_snapshot_entries(
+            site__in=site_ids, language__in=languages
+        ).order_by("site_id", "language", "path")
+        if path_prefix:
+            entries = entries.filter(path__startswith=path_prefix)
+        rows = entries.values_list(
+            "site", "language", "url", "title", "path", "depth", "in_navigation"
+        )
+
+        def get_item(row):
+            return row[2:]
+
+    else:
+        titles = get_published_titles(site_ids, languages)
+        if path_prefix:
+            titles = titles.filter(
+                **{"page__" + PATH_COLUMN + "__startswith": path_prefix}
+            )
+        rows = titles.values_list(
+            "page__" + SITE_COLUMN,
+            "language",
+            "page__" + PATH_COLUMN,
+            "page__" + DEPTH_COLUMN,
+            "page__in_navigation",
+            "page__is_home",
+            "slug",
+            "path",
+            "title",
+            "menu_title",
+        )
+
+        def get_item(row):
+            language, path, depth, in_navigation = row[1:5]
+            is_home, slug, title_path, title, menu_title = row[5:]
+            url = get_page_url(is_home, title_path, slug, language)
+            return url, menu_title or title, path, depth, in_navigation
+
+    count = 0
+    with measure("query"):
+        # Sites and languages which have not been requested may be fetched
+        # when several sites are given.
+        for (site_id, language), group in groupby(rows, itemgetter(0, 1)):
+            tree = trees.get((site_id, language))
+            if tree is not None:
+                tree.extend(get_item(row) for row in group)
+                count += len(tree)
+    count_rows(count)
+    return trees
+
+
+def get_branch_path(path):
+    """
+    Returns the path of the branch of the page tree containing the node with
+    the given path, or ``None`` if the node is above the depth of the branches
+    (see the BRANCH_DEPTH setting).
+    """
+    length = TreeNode.steplen * settings.BRANCH_DEPTH
+    return path[:length] if len(path) >= length else None
+
+
+def get_branch_id(site_id, branch_path):
+    """
+    Returns the ID of the tree node rooting the branch of the page tree of the
+    given site with the given path, or ``None`` if there is none.
+    """
+    nodes = tree_provider.get_public_nodes(site_id).filter(path=branch_path)
+    return nodes.values_list("pk", flat=True).first()
+
+
+def get_branch_page_tree(site_id, language):
+    """
+    Returns the page tree of the given site and language, as returned by
+    ``get_page_tree``, assembled from its branches which are cached
+    separately. Only the branches that changed since they were cached are
+    read from the database (see ``bump_branch_version``).
+
+    Inserting or moving a page renumbers the paths of the following siblings,
+    so branches are cached under the ID of their root node and hold the paths
+    of their pages relative to it. The pages above the branches are cached
+    with the IDs of their nodes. The current paths of these nodes are read on
+    each call.
+    """
+    nodes = tree_provider.get_public_nodes(site_id).filter(
+        depth__lte=settings.BRANCH_DEPTH
+    )
+    with measure("query"):
+        node_paths = dict(nodes.values_list("pk", "path"))
+    branch_paths = {
+        pk: path
+        for pk, path in node_paths.items()
+        if len(path) == TreeNode.steplen * settings.BRANCH_DEPTH
+    }
+    structure_version, branch_versions = get_branch_versions(
+        site_id, list(branch_paths)
+    )
+
+    # The pages above the branches are cached under the None key.
+    keys = {None: get_branch_cache_key(site_id, language, structure_version)}
+    for pk, version in branch_versions.items():
+        keys[pk] = get_branch_cache_key(
+            site_id, language, structure_version, pk, version
+        )
+    cache = get_cache()
+    values = cache.get_many(list(keys.values()))
+    parts = {pk: values.get(key) for pk, key in keys.items()}
+
+    missing = [pk for pk, part in parts.items() if part is None]
+    if len(missing) == 1 and missing[0] is not None:
+        branch_path = branch_paths[missing[0]]
+        offset = len(branch_path)
+        tree = get_page_trees([(site_id, language)], branch_path)[site_id, language]
+        parts[missing[0]] = [
+            (url, title, path[offset:], depth, in_navigation)
+            for url, title, path, depth, in_navigation in tree
+        ]
+    elif missing:
+        parts = {pk: [] for pk in keys}
+        branch_ids = {path: pk for pk, path in branch_paths.items()}
+        node_ids = {path: pk for pk, path in node_paths.items()}
+        offset = TreeNode.steplen * settings.BRANCH_DEPTH
+        tree = get_page_trees([(site_id, language)])[site_id, language]
+        for url, title, path, depth, in_navigation in tree:
+            branch_path = get_branch_path(path)
+            if branch_path is None:
+                item = (node_ids.get(path), url, title, depth, in_navigation)
+                parts[None].append(item)
+            elif branch_path in branch_ids:
+                item = (url, title, path[offset:], depth, in_navigation)
+                parts[branch_ids[branch_path]].append(item)
+    if missing:
+        cache.set_many(
+            {keys[pk]: parts[pk] for pk in missing}, settings.CACHE_TIMEOUT
+        )
+
+    # Paths of the branches sort between the paths of the pages above them.
+    chunks = []
+    for pk, url, title, depth, in_navigation in parts[None]:
+        path = node_paths.get(pk)
+        if path is not None:
+            chunks.append((path, [(url, title, path, depth, in_navigation)]))
+    for pk, branch_path in branch_paths.items():
+        chunks.append(
+            (
+                branch_path,
+                [
+                    (url, title, branch_path + suffix, depth, in_navigation)
+                    for url, title, suffix, depth, in_navigation in parts[pk]
+                ],
+            )
+        )
+    chunks.sort(key=itemgetter(0))
+    return [item for path, chunk in chunks for item in chunk]
+
+
+def get_visible_page_tree(request, site, language):
+    """
+    Returns a page tree in the same format as ``get_page_tree`` holding the
+    pages of the given site and language that the user of the given request
+    can view according to the permissions of django CMS, including the pages
+    requiring a login if the user is authenticated.
+    """
+    login_required = None if request.user.is_authenticated else False
+    with measure("query"):
+        pages = list(get_published_pages(site, language, login_required))
+        rows = []
+        for page in get_visible_nodes(request, pages, site):
+            node = get_node(page)
+            rows.append(
+                (page.pk, page.is_home, node.path, node.depth, page.in_navigation)
+            )
+        entries = get_entries(rows, language)
+    count_rows(len(rows))
+    tree = []
+    for row in rows:
+        entry = entries[row[0]]
+        tree.append((entry.url, entry.title, entry.path, entry.depth, row[4]))
+    return tree
+
+
+def get_request_page_tree(request, site, language, version, load=True):
+    """
+    Returns the page tree of the given site and language, which is only
+    computed once per request and version of the tree so that all the
+    sitemaps of a page share it. If ``load`` is false, ``None`` is returned
+    unless the tree has already been computed during the request. If view
+    permissions are enabled, only the pages the user can view are included.
+    """
+    trees = request.__dict__.setdefault("_htmlsitemap_page_trees", {})
+    key = (site.pk, language, version)
+    if key not in trees:
+        if not load:
+            return None
+        if settings.VIEW_PERMISSIONS:
+            trees[key] = get_visible_page_tree(request, site, language)
+        else:
+            trees[key] = get_page_tree(site, language)
+    return trees[key]
+
+
+def get_menu_page_tree(request):
+    """
+    Returns a page tree in the same format as ``get_page_tree`` built from the
+    nodes of the django CMS menu, which are cached by django CMS. Only the
+    nodes of the pages which do not require a login are kept, unless view
+    permissions are enabled and the user is authenticated. As the nodes do
+    not carry the tree paths of their pages, paths are computed from the
+    positions of the nodes in the menu (see ``get_cut_home_children``).
+    """
+    if "_htmlsitemap_menu_tree" in request.__dict__:
+        return request._htmlsitemap_menu_tree
+
+    renderer = menu_pool.get_renderer(request)
+    with measure("query"):
+        nodes = renderer.get_nodes()
+
+    tree = []
+    page_paths = {}
+    # The nodes are already filtered by django CMS according to the view
+    # permissions of the user.
+    include_protected = settings.VIEW_PERMISSIONS and request.user.is_authenticated
+
+    roots = [node for node in nodes if not node.parent]
+    home_children = get_cut_home_children(roots)
+    roots = [node for node in roots if node not in home_children]
+
+    def add_nodes(nodes, parent_path, depth):
+        position = 0
+        for node in nodes:
+            if not node.attr.get("is_page") or (
+                node.attr.get("auth_required") and not include_protected
+            ):
+                continue
+            position += 1
+            path = TreeNode._get_path(parent_path, depth, position)
+            tree.append(
+                (node.get_absolute_url(), node.title, path, depth, node.visible)
+            )
+            page_paths[node.id] = path
+            children = node.children
+            if node.attr.get("is_home"):
+                children = home_children + children
+            add_nodes(children, path, depth + 1)
+
+    add_nodes(roots, None, 1)
+    count_rows(len(tree))
+    request._htmlsitemap_menu_tree = tree
+    request._htmlsitemap_menu_paths = page_paths
+    request._htmlsitemap_menu_draft = getattr(renderer, "draft_mode_active", False)
+    return tree
+
+
+def get_cut_home_children(roots):
+    """
+    Returns the nodes among the given root nodes of the django CMS menu which
+    stand for children of the home page. django CMS cuts them loose from the
+    home page when it is not in navigation, in which case the paths of the
+    pages are read to tell them from the other root pages.
+    """
+    home = next((node for node in roots if node.attr.get("is_home")), None)
+    if home is None or home.visible:
+        return []
+    candidates = [
+        node for node in roots if node is not home and node.attr.get("is_page")
+    ]
+    if not candidates:
+        return []
+    with measure("query"):
+        paths = dict(
+            Page.objects.filter(
+                pk__in=[home.id] + [node.id for node in candidates]
+            ).values_list("pk", PATH_COLUMN)
+        )
+    home_path = paths[home.id]
+    return [
+        node
+        for node in candidates
+        if node.id in paths and paths[node.id].startswith(home_path)
+    ]
+
+
+def get_menu_page_paths(request):
+    """
+    Returns a dictionary mapping the IDs of the pages of the tree returned by
+    ``get_menu_page_tree`` to their paths in this tree. These are the IDs of
+    the draft pages if the menu shows them (see ``is_menu_draft``).
+    """
+    get_menu_page_tree(request)
+    return request._htmlsitemap_menu_paths
+
+
+def is_menu_draft(request):
+    """
+    Returns whether the nodes of the django CMS menu of the given request are
+    built from the draft pages, which is the case when the toolbar of an
+    editor shows them.
+    """
+    get_menu_page_tree(request)
+    return request._htmlsitemap_menu_draft
+
+
+def get_root_path(instance, request=None, page_paths=None):
+    """
+    Returns the path of the node whose descendants are listed in the sitemap
+    of the given plugin instance, or ``None`` if the whole tree is listed.
+
+    If a dictionary mapping page IDs to paths is given (see
+    ``get_menu_page_paths``), the path is looked up in it rather than in the
+    page tree. ``False`` is returned if the root is not found, in which case
+    the sitemap is empty.
+    """
+    draft = page_paths is not None and is_menu_draft(request)
+    if instance.root_page_id:
+        return get_root_page_path(instance, page_paths, draft)
+    return get_section_path(instance, request, page_paths, draft)
+
+
+def get_root_page_path(instance, page_paths=None, draft=False):
+    if draft:
+        return page_paths.get(instance.root_page_id, False)
+    root = (
+        Page.objects.filter(publisher_draft=instance.root_page_id)
+        .values_list("pk", PATH_COLUMN)
+        .first()
+    )
+    if root is None:
+        # The root page is not published.
+        return False
+    if page_paths is not None:
+        return page_paths.get(root[0], False)
+    return root[1]
+
+
+def get_section_path(instance, request, page_paths=None, draft=False):
+    """
+    Returns the path of the ancestor of the current page at the section depth
+    of the given plugin instance, or ``None`` if the sitemap is not limited to
+    the section of the current page.
+    """
+    page = getattr(request, "current_page", None)
+    if not instance.section_depth or page is None:
+        return None
+    if page_paths is not None:
+        path = page_paths.get(
+            page.pk
+            if draft or not page.publisher_is_draft
+            else page.publisher_public_id
+        )
+        if path is None:
+            return False
+    else:
+        path = get_node(page).path
+    return path[: TreeNode.steplen * instance.section_depth]
+
+
+def slice_page_tree(tree, instance, root_path=None):
+    """
+    Returns the same list of ``(entry, info)`` tuples as
+    ``get_annotated_entries`` for the given plugin instance, computed in
+    memory from a page tree returned by ``get_page_tree`` or
+    ``get_menu_page_tree``.
+    """
+    with measure("annotation"):
+        min_depth, max_depth = instance.min_depth, instance.max_depth
+        parent_depth = len(root_path) // TreeNode.steplen if root_path else 0
+        last_depth = get_last_depth(instance, parent_depth)
+        entries = []
+        for url, title, path, depth, in_navigation in tree:
+            if root_path and (depth <= parent_depth or not path.startswith(root_path)):
+                continue
+            if (
+                depth < min_depth
+                or (max_depth and depth > max_depth)
+                or (
+                    instance.in_navigation is not None
+                    and in_navigation != instance.in_navigation
+                )
+            ):
+                continue
+            # Entries are annotated in place, they are not shared between
+            # sitemaps.
+            entries.append(SitemapEntry(url, title, path, depth))
+        if last_depth is not None:
+            entries, parent_paths = split_levels(
+                ((entry, entry.path) for entry in entries), instance.lazy_levels
+            )
+        annotated_entries = list(iter_annotated_entries(entries))
+        if last_depth is not None:
+            add_subtree_urls(annotated_entries, instance, parent_paths)
+    return annotated_entries
+
+
+def get_last_modified(instance, site, language, root_path=None):
+    """
+    Returns the date of the latest change of the pages displayed in the sitemap
+    of the given plugin instance (see ``get_root_path`` for ``root_path``), or
+    ``None`` if it is empty.
+
+    Unpublishing or deleting a page does not change the other pages, so the
+    date of the latest change of the page tree is taken into account as well:
+    the date never goes backwards.
+    """
+    dates = [get_tree_modified(getattr(site, "pk", site))]
+    if root_path is not False:
+        pages = filter_for_instance(get_published_pages(site, language), instance)
+        if root_path:
+            pages = filter_for_root(pages, root_path)
+        dates.append(
+            pages.aggregate(last_modified=Max("changed_date"))["last_modified"]
+        )
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
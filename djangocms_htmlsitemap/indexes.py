@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django import VERSION as DJANGO_VERSION
+from django.db import connections
+from django.db.models import Index, Q
+
+from cms.models.pagemodel import Page
+from cms.models.titlemodels import Title
+
+from .tree import PAGE_VALUES, TreeNode, get_published_pages, tree_provider
+
+
+def get_sitemap_indexes():
+    """
+    Returns a list of ``(model, index)`` tuples describing the indexes matching
+    the queries used to build sitemaps. Indexes are partial where supported so
+    that they only cover public pages.
+    """
+    public_pages = {}
+    if DJANGO_VERSION >= (2, 2):
+        public_pages["condition"] = Q(publisher_is_draft=False, login_required=False)
+
+    return [
+        # Pages of a site ordered by path.
+        (TreeNode, Index(fields=["site", "path"], name="htmlsitemap_node_site_path")),
+        # Public pages of a node.
+        (
+            Page,
+            Index(
+                fields=[tree_provider.node_field or "path", "in_navigation"],
+                name="htmlsitemap_page_public",
+                **public_pages
+            ),
+        ),
+        # Published titles of a language.
+        (
+            Title,
+            Index(
+                fields=["language", "published", "page"],
+                name="htmlsitemap_title_language",
+            ),
+        ),
+    ]
+
+
+def get_existing_index_names(using="default"):
+    connection = connections[using]
+    names = set()
+    with connection.cursor() as cursor:
+        for model, index in get_sitemap_indexes():
+            names.update(
+                connection.introspection.get_constraints(cursor, model._meta.db_table)
+            )
+    return names
+
+
+def create_sitemap_indexes(using="default"):
+    """
+    Creates the sitemap indexes which do not exist yet and returns their names.
+    """
+    existing_names = get_existing_index_names(using)
+    created = []
+    with connections[using].schema_editor() as schema_editor:
+        for model, index in get_sitemap_indexes():
+            if index.name not in existing_names:
+                schema_editor.add_index(model, index)
+                created.append(index.name)
+    return created
+
+
+def drop_sitemap_indexes(using="default"):
+    """
+    Drops the existing sitemap indexes and returns their names.
+    """
+    existing_names = get_existing_index_names(using)
+    dropped = []
+    with connections[using].schema_editor() as schema_editor:
+        for model, index in get_sitemap_indexes():
+            if index.name in existing_names:
+                schema_editor.remove_index(model, index)
+                dropped.append(index.name)
+    return dropped
+
+
+def explain_sitemap_queries(site, language, using="default"):
+    """
+    Returns the execution plans of the queries fetching the pages and the
+    titles of a sitemap of the given site and language.
+    """
+    pages = get_published_pages(site, language).using(using)
+    page_ids = list(pages.values_list("pk", flat=True)[:100])
+    titles = Title.objects.using(using).filter(page__in=page_ids, language=language)
+    return [
+        pages.values_list(*PAGE_VALUES).explain(),
+        titles.values_list("page_id", "slug", "path", "title", "menu_title").explain(),
+    ]
+
+
+def get_used_index_names(site, language, using="default"):
+    """
+    Returns the names of the sitemap indexes which appear in the execution
+    plans of the sitemap queries.
+    """
+    plans = "\n".join(explain_sitemap_queries(site, language, using))
+    return {
+        index.name for model, index in get_sitemap_indexes() if index.name in plans
+    }
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import threading
+from contextlib import contextmanager
+from time import time
+
+from django.utils.module_loading import import_string
+
+from .compat import CAN_WRAP_QUERIES, execute_wrapper
+from .conf import settings
+from .signals import sitemap_rendered
+
+
+_state = threading.local()
+_backends = {}
+
+
+class RenderMetrics(object):
+    """
+    Metrics collected while the sitemap of a plugin instance is rendered.
+
+    ``timings`` maps the name of each measured step ("query", "annotation",
+    "template" and "total") to the number of seconds spent in it. ``queries``
+    is ``None`` when SQL queries cannot be counted (Django < 2.0).
+    """
+
+    def __init__(self, instance, site_id, language):
+        self.instance = instance
+        self.site_id = site_id
+        self.language = language
+        self.cache_hit = None
+        self.rows = 0
+        self.queries = 0 if CAN_WRAP_QUERIES else None
+        self.timings = {}
+        self.started = time()
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def as_dict(self):
+        return {
+            "instance": self.instance.pk,
+            "site": self.site_id,
+            "language": self.language,
+            "cache_hit": self.cache_hit,
+            "rows": self.rows,
+            "queries": self.queries,
+            "timings": dict(self.timings),
+        }
+
+
+class BaseMetricsBackend(object):
+    """
+    Base class of the metrics backends, which receive the metrics of each
+    rendered sitemap when their dotted path is set as the METRICS_BACKEND
+    setting.
+    """
+
+    def record(self, metrics):
+        raise NotImplementedError
+
+
+class InMemoryMetricsBackend(BaseMetricsBackend):
+    """
+    Keeps the metrics of the rendered sitemaps in a list. Mostly useful in
+    tests.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, metrics):
+        self.records.append(metrics)
+
+    def clear(self):
+        del self.records[:]
+
+
+def get_metrics_backend():
+    """
+    Returns the metrics backend instance defined by the METRICS_BACKEND
+    setting, or ``None`` if no backend is configured.
+    """
+    path = settings.METRICS_BACKEND
+    if not path:
+        return None
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def is_enabled():
+    return bool(settings.METRICS_BACKEND) or sitemap_rendered.has_listeners()
+
+
+def start_metrics(instance, site_id, language):
+    """
+    Returns a new RenderMetrics instance for the given sitemap, or ``None``
+    if nothing consumes the metrics.
+    """
+    if not is_enabled():
+        return None
+    return RenderMetrics(instance, site_id, language)
+
+
+@contextmanager
+def collect(metrics):
+    """
+    Makes the given metrics the target of the measures taken in the block and
+    counts the SQL queries it runs. Does nothing if ``metrics`` is ``None``.
+    """
+    if metrics is None:
+        yield
+        return
+    previous = getattr(_state, "metrics", None)
+    _state.metrics = metrics
+    try:
+        with execute_wrapper(metrics.count_query):
+            yield
+    finally:
+        _state.metrics = previous
+
+
+@contextmanager
+def measure(step):
+    """
+    Adds the time spent in the block to the given step of the metrics being
+    collected, if any.
+    """
+    metrics = getattr(_state, "metrics", None)
+    if metrics is None:
+        yield
+        return
+    start = time()
+    try:
+        yield
+    finally:
+        metrics.timings[step] = metrics.timings.get(step, 0) + time() - start
+
+
+def count_rows(rows):
+    """
+    Adds the given number of fetched rows to the metrics being collected.
+    """
+    metrics = getattr(_state, "metrics", None)
+    if metrics is not None:
+        metrics.rows += rows
+
+
+def publish_metrics(metrics):
+    """
+    Sends the given metrics to the configured backend and to the receivers of
+    the sitemap_rendered signal.
+    """
+    metrics.timings["total"] = time() - metrics.started
+    backend = get_metrics_backend()
+    if backend is not None:
+        backend.record(metrics)
+    sitemap_rendered.send(sender=RenderMetrics, metrics=metrics)
+
+
+class MeasuredTemplate(object):
+    """
+    Wraps a template so that its rendering is included in the given metrics,
+    which are published once the template is rendered.
+    """
+
+    def __init__(self, template, metrics):
+        self.template = template
+        self.metrics = metrics
+
+    def render(self, context=None, request=None):
+        with collect(self.metrics), measure("template"):
+            content = self.template.render(context, request)
+        publish_metrics(self.metrics)
+        return content
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import multiprocessing
+
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+
+from cms.utils.i18n import get_language_list
+
+from djangocms_htmlsitemap.conf import settings
+from djangocms_htmlsitemap.prebuilding import build_all_static_sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the HTML sitemaps of all the plugin instances into the "
+        "HTMLSITEMAP_STATIC_DIR directory, from which they are then served."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--site", action="append", type=int, dest="sites", help="Site ID"
+        )
+        parser.add_argument(
+            "--language", action="append", dest="languages", help="Language code"
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help="Number of processes building the sitemaps",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.STATIC_DIR:
+            raise CommandError("The HTMLSITEMAP_STATIC_DIR setting is not set.")
+
+        sites = Site.objects.all()
+        if options["sites"]:
+            sites = sites.filter(pk__in=options["sites"])
+
+        sites_languages = [
+            (site.pk, language)
+            for site in sites
+            for language in options["languages"] or get_language_list(site.pk)
+        ]
+        results = build_all_static_sitemaps(sites_languages, options["jobs"])
+        for (site_id, language), paths in results:
+            self.stdout.write(
+                "Built {0} sitemap(s) of site #{1} ({2})".format(
+                    len(paths), site_id, language
+                )
+            )
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django import VERSION as DJANGO_VERSION
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from djangocms_htmlsitemap.indexes import (
+    explain_sitemap_queries,
+    get_existing_index_names,
+    get_sitemap_indexes,
+    get_used_index_names,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports whether the indexes created by create_htmlsitemap_indexes "
+        "exist and are used by the queries building HTML sitemaps."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--site", type=int, help="Site ID")
+        parser.add_argument("--language", help="Language code")
+        parser.add_argument(
+            "--database", default=DEFAULT_DB_ALIAS, help="Database alias"
+        )
+        parser.add_argument(
+            "--plans", action="store_true", help="Prints the execution plans"
+        )
+
+    def handle(self, *args, **options):
+        if DJANGO_VERSION < (2, 1):  # pragma: no cover
+            raise CommandError("Execution plans require Django 2.1 or later.")
+
+        using = options["database"]
+        site = Site.objects.get(pk=options["site"] or settings.SITE_ID)
+        language = options["language"] or settings.LANGUAGE_CODE
+
+        existing_names = get_existing_index_names(using)
+        used_names = get_used_index_names(site, language, using)
+        for model, index in get_sitemap_indexes():
+            if index.name not in existing_names:
+                status = "missing"
+            elif index.name in used_names:
+                status = "used"
+            else:
+                status = "not used"
+            self.stdout.write(
+                "{0} on {1}: {2}".format(index.name, model._meta.db_table, status)
+            )
+
+        if options["plans"]:
+            for plan in explain_sitemap_queries(site, language, using):
+                self.stdout.write("\n" + plan)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from djangocms_htmlsitemap.indexes import create_sitemap_indexes, drop_sitemap_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates database indexes matching the queries used to build HTML "
+        "sitemaps on the tables of django CMS. These indexes are not managed by "
+        "migrations: run the command again with --drop before migrating django "
+        "CMS if one of its migrations fails because of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--drop", action="store_true", help="Drops the indexes instead"
+        )
+        parser.add_argument(
+            "--database", default=DEFAULT_DB_ALIAS, help="Database alias"
+        )
+
+    def handle(self, *args, **options):
+        if options["drop"]:
+            names = drop_sitemap_indexes(options["database"])
+            message = "Dropped index {0}"
+        else:
+            names = create_sitemap_indexes(options["database"])
+            message = "Created index {0}"
+
+        for name in names:
+            self.stdout.write(message.format(name))
+        if not names:
+            self.stdout.write("Nothing to do")
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import io
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+
+from djangocms_htmlsitemap.engine import get_root_path
+from djangocms_htmlsitemap.models import HtmlSitemapPluginConf
+from djangocms_htmlsitemap.streaming import (
+    iter_sitemap_entries,
+    iter_sitemap_json,
+    iter_sitemap_xml,
+)
+
+
+SERIALIZERS = {"json": iter_sitemap_json, "xml": iter_sitemap_xml}
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports the sitemap of a plugin instance as JSON or XML. Pages are "
+        "fetched and written by chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("pk", type=int, help="ID of the plugin instance")
+        parser.add_argument("--site", type=int, help="Site ID")
+        parser.add_argument("--language", help="Language code")
+        parser.add_argument(
+            "--format", choices=sorted(SERIALIZERS), default="json", help="Format"
+        )
+        parser.add_argument("--output", help="Output file (defaults to stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            instance = HtmlSitemapPluginConf.objects.get(pk=options["pk"])
+        except HtmlSitemapPluginConf.DoesNotExist:
+            raise CommandError(
+                "Plugin instance #{0} does not exist.".format(options["pk"])
+            )
+        site = Site.objects.get(pk=options["site"] or settings.SITE_ID)
+        language = options["language"] or settings.LANGUAGE_CODE
+
+        entries = iter_sitemap_entries(
+            instance, site, language, root_path=get_root_path(instance)
+        )
+        chunks = SERIALIZERS[options["format"]](entries)
+        if options["output"]:
+            with io.open(options["output"], "w", encoding="utf-8") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
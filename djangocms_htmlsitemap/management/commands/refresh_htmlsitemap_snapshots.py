@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand
+
+from cms.utils.i18n import get_language_list
+
+from djangocms_htmlsitemap.cache import bump_tree_version
+from djangocms_htmlsitemap.snapshots import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the precomputed HTML sitemap snapshots."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--site", action="append", type=int, dest="sites", help="Site ID"
+        )
+        parser.add_argument(
+            "--language", action="append", dest="languages", help="Language code"
+        )
+
+    def handle(self, *args, **options):
+        sites = Site.objects.all()
+        if options["sites"]:
+            sites = sites.filter(pk__in=options["sites"])
+
+        for site in sites:
+            for language in options["languages"] or get_language_list(site.pk):
+                refresh_snapshot(site, language)
+                self.stdout.write(
+                    "Refreshed the snapshot of site #{0} ({1})".format(
+                        site.pk, language
+                    )
+                )
+            bump_tree_version(site.pk)
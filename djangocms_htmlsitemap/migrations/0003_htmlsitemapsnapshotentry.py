@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.28 on 2026-10-18 07:41
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0001_initial"),
+        ("cms", "0011_auto_20150419_1006"),
+        ("djangocms_htmlsitemap", "0002_auto_20180228_1210"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HtmlSitemapSnapshotEntry",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("language", models.CharField(max_length=15, verbose_name="Language")),
+                ("path", models.CharField(max_length=255, verbose_name="Path")),
+                ("depth", models.PositiveIntegerField(verbose_name="Depth")),
+                ("in_navigation", models.BooleanField(verbose_name="In navigation")),
+                ("url", models.CharField(max_length=2048, verbose_name="URL")),
+                ("title", models.CharField(max_length=255, verbose_name="Title")),
+                (
+                    "page",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="cms.Page",
+                        verbose_name="Page",
+                    ),
+                ),
+                (
+                    "site",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="sites.Site",
+                        verbose_name="Site",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "HTML Sitemap snapshot entry",
+                "verbose_name_plural": "HTML Sitemap snapshot entries",
+                "ordering": ("site", "language", "path"),
+                "unique_together": {("site", "language", "page")},
+                "index_together": {("site", "language", "path")},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.28 on 2026-10-18 07:49
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangocms_htmlsitemap", "0003_htmlsitemapsnapshotentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="htmlsitemappluginconf",
+            name="lazy_levels",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="If set, only this number of levels is rendered with the page, deeper levels are loaded on demand.",
+                null=True,
+                verbose_name="Levels loaded at once",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.28 on 2026-10-18 08:02
+from __future__ import unicode_literals
+
+import cms.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cms", "0011_auto_20150419_1006"),
+        ("djangocms_htmlsitemap", "0004_htmlsitemappluginconf_lazy_levels"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="htmlsitemappluginconf",
+            name="root_page",
+            field=cms.models.fields.PageField(
+                blank=True,
+                help_text="If set, only the descendants of this page are listed.",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="cms.Page",
+                verbose_name="Root page",
+            ),
+        ),
+        migrations.AddField(
+            model_name="htmlsitemappluginconf",
+            name="section_depth",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="If set, only the descendants of the ancestor of the current page at this depth are listed. Ignored if a root page is set.",
+                null=True,
+                verbose_name="Section depth",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.2.28 on 2026-10-18 11:24
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangocms_htmlsitemap", "0005_htmlsitemappluginconf_root"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="htmlsitemapsnapshotentry",
+            name="publication_date",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Publication date"
+            ),
+        ),
+        migrations.AddField(
+            model_name="htmlsitemapsnapshotentry",
+            name="publication_end_date",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Publication end date"
+            ),
+        ),
+    ]
@@ -2,11 +2,13 @@
 
 from __future__ import unicode_literals
 
+from django.contrib.sites.models import Site
 from django.db import models
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 
-from cms.models import CMSPlugin
+from cms.models import CMSPlugin, Page
+from cms.models.fields import PageField
 
 
 @python_2_unicode_compatible
@@ -18,6 +20,32 @@ class HtmlSitemapPluginConf(CMSPlugin):
     in_navigation = models.NullBooleanField(
         verbose_name=_("In navigation"), default=None
     )
+    lazy_levels = models.PositiveIntegerField(
+        verbose_name=_("Levels loaded at once"),
+        blank=True,
+        null=True,
+        help_text=_(
+            "If set, only this number of levels is rendered with the page, deeper "
+            "levels are loaded on demand."
+        ),
+    )
+    root_page = PageField(
+        verbose_name=_("Root page"),
+        blank=True,
+        null=True,
+        related_name="+",
+        on_delete=models.SET_NULL,
+        help_text=_("If set, only the descendants of this page are listed."),
+    )
+    section_depth = models.PositiveIntegerField(
+        verbose_name=_("Section depth"),
+        blank=True,
+        null=True,
+        help_text=_(
+            "If set, only the descendants of the ancestor of the current page at "
+            "this depth are listed. Ignored if a root page is set."
+        ),
+    )
 
     class Meta:
         verbose_name = _("HTML Sitemap plugin configuration")
@@ -25,3 +53,43 @@ class HtmlSitemapPluginConf(CMSPlugin):
 
     def __str__(self):
         return "Django-CMS HTML Sitemap #{0}".format(self.pk)
+
+
+@python_2_unicode_compatible
+class HtmlSitemapSnapshotEntry(models.Model):
+    """
+    A page of the precomputed sitemap of a site in a given language. Entries
+    are stored in tree order so that sitemaps can be rendered from this table
+    alone, without joining pages, tree nodes and titles.
+    """
+
+    site = models.ForeignKey(
+        Site, verbose_name=_("Site"), related_name="+", on_delete=models.CASCADE
+    )
+    language = models.CharField(verbose_name=_("Language"), max_length=15)
+    page = models.ForeignKey(
+        Page, verbose_name=_("Page"), related_name="+", on_delete=models.CASCADE
+    )
+    path = models.CharField(verbose_name=_("Path"), max_length=255)
+    depth = models.PositiveIntegerField(verbose_name=_("Depth"))
+    in_navigation = models.BooleanField(verbose_name=_("In navigation"))
+    url = models.CharField(verbose_name=_("URL"), max_length=2048)
+    title = models.CharField(verbose_name=_("Title"), max_length=255)
+    # Publication dates of the page, checked when sitemaps are read so that
+    # scheduled pages appear and expired ones disappear without a refresh.
+    publication_date = models.DateTimeField(
+        verbose_name=_("Publication date"), blank=True, null=True
+    )
+    publication_end_date = models.DateTimeField(
+        verbose_name=_("Publication end date"), blank=True, null=True
+    )
+
+    class Meta:
+        verbose_name = _("HTML Sitemap snapshot entry")
+        verbose_name_plural = _("HTML Sitemap snapshot entries")
+        ordering = ("site", "language", "path")
+        unique_together = (("site", "language", "page"),)
+        index_together = (("site", "language", "path"),)
+
+    def __str__(self):
+        return self.title
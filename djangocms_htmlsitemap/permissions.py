@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import hashlib
+
+from cms.models.permissionmodels import PagePermission
+from cms.utils.page_permissions import user_can_view_all_pages
+
+
+def get_permission_fingerprint(user, site):
+    """
+    Returns a string identifying the pages of the given site that the given
+    user can view, so that sitemaps can be cached once for all the users
+    sharing the same permissions rather than for each user. Users are grouped
+    by groups and staff status, unless they can view all the pages or are
+    granted view permissions of their own.
+    """
+    if not user.is_authenticated:
+        return "anonymous"
+    if user_can_view_all_pages(user, site):
+        return "all"
+
+    parts = ["staff" if user.is_staff else "user"]
+    parts.extend(
+        str(pk) for pk in user.groups.order_by("pk").values_list("pk", flat=True)
+    )
+    if PagePermission.objects.filter(user=user).exists():
+        parts.append("user-{0}".format(user.pk))
+    return hashlib.md5(":".join(parts).encode("utf-8")).hexdigest()
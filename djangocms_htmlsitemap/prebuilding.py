@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+
+import django
+from django.db import connections
+from django.template.loader import get_template
+
+from .conf import settings
+from .engine import get_page_trees, get_root_path, slice_page_tree
+from .models import HtmlSitemapPluginConf
+from .rendering import SITEMAP_TEMPLATE, FastSitemapTemplate, can_render_fast
+from .tree import AnnotatedEntries, get_entry_list
+
+
+replace_file = getattr(os, "replace", os.rename)
+
+
+def get_site_directory(site_id):
+    return os.path.join(settings.STATIC_DIR, str(site_id))
+
+
+def get_changed_marker_path(site_id):
+    return os.path.join(get_site_directory(site_id), "changed")
+
+
+def get_static_sitemap_path(instance, site_id, language):
+    """
+    Returns the path of the pre-built sitemap of the given plugin instance.
+    The name of the file depends on the options of the instance so that
+    changing them does not serve an outdated file.
+    """
+    name = "{0}-{1}-{2}-{3}-{4}-{5}.html".format(
+        instance.pk,
+        instance.min_depth,
+        instance.max_depth,
+        instance.in_navigation,
+        instance.lazy_levels,
+        instance.root_page_id,
+    )
+    return os.path.join(get_site_directory(site_id), language, name)
+
+
+def can_prebuild(instance):
+    # Sitemaps limited to the section of the current page depend on the page
+    # they are displayed on and are not pre-built.
+    return bool(instance.root_page_id or not instance.section_depth)
+
+
+def write_file(path, content, mtime=None):
+    """
+    Writes the given content to a temporary file which then replaces the file
+    at the given path, so that readers never get a partially written file.
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:  # pragma: no cover
+            # The directory may have been created by another process.
+            if not os.path.isdir(directory):
+                raise
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with io.open(fd, "w", encoding="utf-8") as temp_file:
+            temp_file.write(content)
+        os.chmod(temp_path, 0o644)
+        if mtime is not None:
+            os.utime(temp_path, (mtime, mtime))
+        replace_file(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+def mark_static_sitemaps_stale(site_id):
+    """
+    Marks the pre-built sitemaps of the given site as outdated. They are not
+    served anymore until they are built again.
+    """
+    if settings.STATIC_DIR:
+        write_file(get_changed_marker_path(site_id), "")
+
+
+def read_static_sitemap(instance, site_id, language):
+    """
+    Returns the pre-built sitemap of the given plugin instance, or ``None`` if
+    there is none or if the page tree of the site changed since it was built.
+    """
+    path = get_static_sitemap_path(instance, site_id, language)
+    try:
+        built = os.path.getmtime(path)
+    except OSError:
+        return None
+    try:
+        changed = os.path.getmtime(get_changed_marker_path(site_id))
+    except OSError:
+        changed = None
+    if changed is not None and changed >= built:
+        return None
+    try:
+        with io.open(path, encoding="utf-8") as static_file:
+            return static_file.read()
+    except (IOError, OSError):  # pragma: no cover
+        return None
+
+
+def render_static_sitemap(instance, annotated_entries):
+    pages = get_entry_list(annotated_entries)
+    context = {
+        "instance": instance,
+        "pages": pages,
+        "annotated_pages": AnnotatedEntries(pages),
+    }
+    if can_render_fast(SITEMAP_TEMPLATE):
+        return FastSitemapTemplate().render(context)
+    return get_template(SITEMAP_TEMPLATE).render(context)
+
+
+def build_static_sitemaps(sites_languages):
+    """
+    Renders the sitemaps of all the plugin instances for the given
+    ``(site_id, language)`` tuples into files. Returns a list of
+    ``((site_id, language), paths)`` tuples.
+    """
+    # The files get the date at which the page trees are read so that changes
+    # made while they are being built mark them as outdated.
+    started = time.time()
+    instances = [
+        (instance, get_root_path(instance))
+        for instance in HtmlSitemapPluginConf.objects.all()
+        if can_prebuild(instance)
+    ]
+    if not instances:
+        return [(key, []) for key in sites_languages]
+
+    results = []
+    for (site_id, language), tree in get_page_trees(sites_languages).items():
+        paths = []
+        for instance, root_path in instances:
+            if root_path is False:
+                annotated_entries = []
+            else:
+                annotated_entries = slice_page_tree(tree, instance, root_path)
+            path = get_static_sitemap_path(instance, site_id, language)
+            html = render_static_sitemap(instance, annotated_entries)
+            write_file(path, html, started)
+            paths.append(path)
+        results.append(((site_id, language), paths))
+    return results
+
+
+def run_build(sites_languages):
+    try:
+        return build_static_sitemaps(sites_languages)
+    finally:
+        connections.close_all()
+
+
+def build_all_static_sitemaps(sites_languages, jobs=1):
+    """
+    Builds the sitemaps of the given ``(site_id, language)`` tuples using a
+    pool of ``jobs`` processes, each of them building all the languages of a
+    site at once. Yields a ``((site_id, language), paths)`` tuple as each of
+    them is built.
+    """
+    if jobs <= 1:
+        for result in build_static_sitemaps(sites_languages):
+            yield result
+        return
+
+    batches = {}
+    for site_id, language in sites_languages:
+        batches.setdefault(site_id, []).append((site_id, language))
+
+    # Connections must not be shared with the processes of the pool.
+    connections.close_all()
+    pool = multiprocessing.Pool(jobs, initializer=django.setup)
+    try:
+        for results in pool.imap_unordered(run_build, list(batches.values())):
+            for result in results:
+                yield result
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
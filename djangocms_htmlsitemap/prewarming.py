@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+
+from django.db import connection, transaction
+
+from cms.utils.i18n import get_language_list
+
+from .cache import get_tree_version, set_cached_sitemap
+from .conf import settings
+from .engine import get_page_tree, get_page_trees, get_root_path, slice_page_tree
+from .models import HtmlSitemapPluginConf
+from .tree import get_entry_list
+
+
+logger = logging.getLogger(__name__)
+
+_pending_sites = set()
+_pending_lock = threading.Lock()
+
+
+def prewarm_sitemaps(site_id):
+    """
+    Computes the sitemaps of all the plugin instances for the given site and
+    each of its languages, and stores them in the cache under the current
+    version of its page tree.
+    """
+    version = get_tree_version(site_id)
+    # Sitemaps limited to the section of the current page depend on the page
+    # they are displayed on and are not prewarmed.
+    instances = [
+        (instance, get_root_path(instance))
+        for instance in HtmlSitemapPluginConf.objects.all()
+        if instance.root_page_id or not instance.section_depth
+    ]
+    if not instances:
+        return
+    sites_languages = [(site_id, language) for language in get_language_list(site_id)]
+    if settings.BRANCH_DEPTH:
+        # Only the branches that changed are read again.
+        trees = {key: get_page_tree(*key) for key in sites_languages}
+    else:
+        trees = get_page_trees(sites_languages)
+    for (site_id, language), tree in trees.items():
+        for instance, root_path in instances:
+            if root_path is False:
+                entries = []
+            else:
+                entries = get_entry_list(slice_page_tree(tree, instance, root_path))
+            set_cached_sitemap(instance, site_id, language, version, entries)
+
+
+def schedule_prewarm(site_id):
+    """
+    Schedules the prewarming of the sitemaps of the given site according to
+    the PREWARM setting. Background prewarming starts once the current
+    transaction is committed so that it sees the changes of the page tree.
+    Sitemaps depending on the permissions of the users are not prewarmed.
+    """
+    if (
+        not settings.PREWARM
+        or settings.MENU_NODES
+        or settings.VIEW_PERMISSIONS
+        or not settings.CACHE_TIMEOUT
+    ):
+        return
+    if settings.PREWARM == "sync":
+        prewarm_sitemaps(site_id)
+    else:
+        transaction.on_commit(lambda: start_prewarm_thread(site_id))
+
+
+def start_prewarm_thread(site_id):
+    """
+    Prewarms the sitemaps of the given site in a background thread, unless
+    this is already pending. Returns the started thread, if any.
+    """
+    with _pending_lock:
+        if site_id in _pending_sites:
+            return None
+        _pending_sites.add(site_id)
+    thread = threading.Thread(target=run_prewarm, args=(site_id,))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def run_prewarm(site_id):
+    # Changes made from now on schedule a new prewarming.
+    with _pending_lock:
+        _pending_sites.discard(site_id)
+    try:
+        prewarm_sitemaps(site_id)
+    except Exception:
+        logger.exception("Unable to prewarm the sitemaps of site %s", site_id)
+    finally:
+        connection.close()
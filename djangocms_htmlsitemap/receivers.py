@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from cms.models.pagemodel import Page
+from cms.signals import page_moved, post_publish, post_unpublish
+
+from .cache import bump_branch_version, bump_structure_version, bump_tree_version
+from .compat import get_page_site_id
+from .conf import settings
+from .engine import get_branch_id, get_branch_path
+from .prebuilding import mark_static_sitemaps_stale
+from .prewarming import schedule_prewarm
+from .snapshots import refresh_page_snapshots
+from .tree import TreeNode, get_node
+
+try:
+    from cms.operations import MOVE_PAGE
+    from cms.signals import post_obj_operation
+except ImportError:  # pragma: no cover
+    post_obj_operation = None
+
+
+def page_tree_changed(page, languages=None, moved=False):
+    """
+    Refreshes the sitemap snapshots of the branch rooted at the given page if
+    they are enabled, and invalidates the sitemaps cached for its site.
+    """
+    if settings.SNAPSHOTS:
+        refresh_page_snapshots(page, languages, moved)
+    if settings.BRANCH_DEPTH:
+        branch_changed(page, moved)
+    site_tree_changed(get_page_site_id(page))
+
+
+def branch_changed(page, moved=False):
+    """
+    Invalidates the cached branch of the page tree containing the given page
+    once the current transaction is committed. Moves and changes of the pages
+    above the branches invalidate all of them.
+    """
+    site_id = get_page_site_id(page)
+    branch_path = get_branch_path(get_node(page).path)
+    branch_id = None
+    if not moved and branch_path is not None:
+        branch_id = get_branch_id(site_id, branch_path)
+    if branch_id is None:
+        transaction.on_commit(lambda: bump_structure_version(site_id))
+    else:
+        transaction.on_commit(lambda: bump_branch_version(site_id, branch_id))
+
+
+def site_tree_changed(site_id):
+    """
+    Invalidates the sitemaps cached or pre-built for the given site and
+    schedules their prewarming if it is enabled, once the current transaction
+    is committed. Invalidating them before would let concurrent requests
+    cache the previous state of the page tree under its new version.
+    """
+    transaction.on_commit(lambda: invalidate_sitemaps(site_id))
+
+
+def invalidate_sitemaps(site_id):
+    bump_tree_version(site_id)
+    mark_static_sitemaps_stale(site_id)
+    schedule_prewarm(site_id)
+
+
+@receiver(post_publish, dispatch_uid="htmlsitemap_post_publish")
+@receiver(post_unpublish, dispatch_uid="htmlsitemap_post_unpublish")
+def invalidate_sitemaps_on_publish(sender, instance, language, **kwargs):
+    page_tree_changed(instance, [language])
+
+
+@receiver(page_moved, dispatch_uid="htmlsitemap_page_moved")
+def invalidate_sitemaps_on_move(sender, instance, **kwargs):
+    page_tree_changed(instance, moved=True)
+
+
+@receiver(post_delete, sender=TreeNode, dispatch_uid="htmlsitemap_node_deleted")
+def invalidate_sitemaps_on_delete(sender, instance, **kwargs):
+    # Snapshot entries of deleted pages are removed by cascade.
+    site_id = instance.site_id
+    if settings.BRANCH_DEPTH:
+        transaction.on_commit(lambda: bump_structure_version(site_id))
+    site_tree_changed(site_id)
+
+
+if post_obj_operation is not None:
+
+    @receiver(post_obj_operation, dispatch_uid="htmlsitemap_post_obj_operation")
+    def invalidate_sitemaps_on_page_operation(sender, operation, **kwargs):
+        page = kwargs.get("obj")
+        if operation == MOVE_PAGE and isinstance(page, Page):
+            page_tree_changed(page, moved=True)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import os
+
+from django.template.loader import get_template
+from django.templatetags.static import static
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .conf import settings
+
+
+SITEMAP_TEMPLATE = "djangocms_htmlsitemap/sitemap.html"
+TREE_TEMPLATE = "djangocms_htmlsitemap/includes/tree.html"
+SUBTREE_TEMPLATE = "djangocms_htmlsitemap/subtree.html"
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Markup produced by the djangocms_htmlsitemap/includes/tree.html template for
+# each entry, whitespace included.
+OPEN_LIST = "\n\t\t\n\t\t\t<ul><li>\n\t\t"
+NEXT_ITEM = "\n\t\t\n\t\t\t</li><li>\n\t\t"
+LINK = '\n\t\t<a href="{0}" title="{1}">{1}</a>'
+SUBTREE = '<div data-htmlsitemap-subtree="{0}"></div>'
+CLOSE_LIST = "\n\t\t\t</li></ul>\n\t\t"
+END_ENTRY = "\n\t\t"
+END_ITEM = "\n\t"
+
+SITEMAP_START = '<div id="sitemap">\n\t'
+SITEMAP_END = "\n</div>"
+SCRIPT = '<script src="{0}" defer></script>'
+
+
+def render_entry(entry, info):
+    """
+    Returns the markup of the given annotated entry, as rendered by the
+    ``djangocms_htmlsitemap/includes/tree.html`` template.
+    """
+    parts = [
+        OPEN_LIST if info.open else NEXT_ITEM,
+        LINK.format(escape(entry.url), escape(entry.title)),
+    ]
+    if info.subtree_url:
+        parts.append(SUBTREE.format(escape(info.subtree_url)))
+    parts.append(END_ENTRY)
+    parts.append(CLOSE_LIST * info.close_count)
+    parts.append(END_ITEM)
+    return "".join(parts)
+
+
+def render_tree(annotated_entries):
+    """
+    Renders the given annotated entries in the same way as the
+    ``djangocms_htmlsitemap/includes/tree.html`` template.
+    """
+    return mark_safe(
+        "".join([render_entry(entry, info) for entry, info in annotated_entries])
+    )
+
+
+def render_sitemap(instance, annotated_entries):
+    """
+    Renders the sitemap of the given plugin instance in the same way as the
+    ``djangocms_htmlsitemap/sitemap.html`` template.
+    """
+    parts = [SITEMAP_START, render_tree(annotated_entries), SITEMAP_END]
+    if instance.lazy_levels:
+        script_url = static("djangocms_htmlsitemap/js/sitemap.js")
+        parts.append(SCRIPT.format(escape(script_url)))
+    parts.append("\n")
+    return mark_safe("".join(parts))
+
+
+def can_render_fast(*template_names):
+    """
+    Returns whether the fast renderer can be used in place of the given
+    templates, that is if it is enabled and if none of the templates is
+    overridden by the project.
+    """
+    if not settings.FAST_RENDERER:
+        return False
+    return all(
+        get_template(name).origin.name.startswith(TEMPLATES_DIR)
+        for name in template_names + (TREE_TEMPLATE,)
+    )
+
+
+class FastSitemapTemplate(object):
+    """
+    Stands for the ``djangocms_htmlsitemap/sitemap.html`` template in the
+    rendering of the sitemap plugin.
+    """
+
+    def render(self, context=None, request=None):
+        return render_sitemap(context["instance"], context["annotated_pages"])
+
+
+class StaticSitemapTemplate(object):
+    """
+    Stands for the ``djangocms_htmlsitemap/sitemap.html`` template when a
+    pre-built sitemap is served.
+    """
+
+    def __init__(self, html):
+        self.html = html
+
+    def render(self, context=None, request=None):
+        return self.html
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.dispatch import Signal
+
+
+# Sent once a sitemap has been rendered while metrics are collected (see the
+# instrumentation module). Receivers get the RenderMetrics instance describing
+# the rendering as the "metrics" keyword argument.
+sitemap_rendered = Signal()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.contrib.sites.models import Site
+from django.db import transaction
+from django.db.models import F
+
+from cms.utils.i18n import get_language_list
+
+from .compat import get_page_site_id
+from .instrumentation import count_rows, measure
+from .models import HtmlSitemapSnapshotEntry
+from .tree import (
+    PAGE_VALUES,
+    PATH_COLUMN,
+    SitemapEntry,
+    filter_publication_dates,
+    get_entries,
+    get_node,
+    get_published_pages,
+    iter_annotated_entries,
+)
+
+
+def refresh_snapshot(site, language, root_path=None):
+    """
+    Rebuilds the sitemap snapshot of the given site and language. If a tree
+    path is given, only the branch rooted at this path is rebuilt, unless the
+    paths of other pages changed since the snapshot was taken.
+
+    Pages whose publication is scheduled or has expired are stored with their
+    publication dates, which are checked when sitemaps are read (see
+    ``filter_publication_dates``).
+    """
+    site_id = getattr(site, "pk", site)
+    with transaction.atomic():
+        # Concurrent refreshes of the snapshots of a site (eg. when pages are
+        # published at the same time) are serialized by locking the site, so
+        # that they do not insert the same entries twice.
+        list(Site.objects.select_for_update().filter(pk=site_id).values("pk"))
+
+        pages = get_published_pages(site_id, language, scheduled=True)
+        stale_entries = HtmlSitemapSnapshotEntry.objects.filter(
+            site_id=site_id, language=language
+        )
+
+        # Inserting or moving a page renumbers the paths of the sibling
+        # branches shifted by treebeard, in which case the whole snapshot is
+        # rebuilt.
+        if (
+            root_path
+            and not stale_entries.exclude(path=F("page__" + PATH_COLUMN)).exists()
+        ):
+            pages = pages.filter(**{PATH_COLUMN + "__startswith": root_path})
+            stale_entries = stale_entries.filter(path__startswith=root_path)
+
+        rows = list(
+            pages.values_list(
+                *PAGE_VALUES + ("publication_date", "publication_end_date")
+            )
+        )
+        entries = get_entries(rows, language)
+
+        stale_entries.delete()
+        HtmlSitemapSnapshotEntry.objects.bulk_create(
+            [
+                HtmlSitemapSnapshotEntry(
+                    site_id=site_id,
+                    language=language,
+                    page_id=page_id,
+                    path=path,
+                    depth=depth,
+                    in_navigation=in_navigation,
+                    url=entries[page_id].url,
+                    title=entries[page_id].title,
+                    publication_date=publication_date,
+                    publication_end_date=publication_end_date,
+                )
+                for (
+                    page_id,
+                    is_home,
+                    path,
+                    depth,
+                    in_navigation,
+                    publication_date,
+                    publication_end_date,
+                ) in rows
+            ]
+        )
+
+
+def refresh_page_snapshots(page, languages=None, moved=False):
+    """
+    Rebuilds the branch of the sitemap snapshots rooted at the given page for
+    the given languages (all the languages of the site of the page by default).
+    The whole snapshots are rebuilt if the page has been moved.
+    """
+    site_id = get_page_site_id(page)
+    root_path = None if moved else get_node(page).path
+    for language in languages or get_language_list(site_id):
+        refresh_snapshot(site_id, language, root_path)
+
+
+def get_snapshot_entries(**filters):
+    """
+    Returns a queryset of the snapshot entries matching the given filters
+    whose page is currently published.
+    """
+    return filter_publication_dates(HtmlSitemapSnapshotEntry.objects.filter(**filters))
+
+
+def annotate_snapshot_entries(rows):
+    """
+    Returns a list of ``(entry, info)`` tuples for the given queryset of
+    snapshot entries.
+    """
+    with measure("query"):
+        rows = list(rows.values_list("url", "title", "path", "depth"))
+    count_rows(len(rows))
+    with measure("annotation"):
+        entries = (SitemapEntry(*values) for values in rows)
+        return list(iter_annotated_entries(entries))
@@ -0,0 +1,42 @@
+/* Loads the subtrees of HTML sitemaps on demand. */
+(function () {
+  "use strict";
+
+  function loadSubtree(placeholder, button) {
+    button.disabled = true;
+    var request = new XMLHttpRequest();
+    request.open("GET", placeholder.getAttribute("data-htmlsitemap-subtree"));
+    request.onload = function () {
+      if (request.status === 200) {
+        placeholder.outerHTML = request.responseText;
+        init();
+      }
+      button.parentNode.removeChild(button);
+    };
+    request.send();
+  }
+
+  function init() {
+    var placeholders = document.querySelectorAll("[data-htmlsitemap-subtree]");
+    Array.prototype.forEach.call(placeholders, function (placeholder) {
+      if (placeholder.getAttribute("data-htmlsitemap-ready")) {
+        return;
+      }
+      placeholder.setAttribute("data-htmlsitemap-ready", "1");
+      var button = document.createElement("button");
+      button.type = "button";
+      button.className = "htmlsitemap-subtree-toggle";
+      button.textContent = "+";
+      button.addEventListener("click", function () {
+        loadSubtree(placeholder, button);
+      });
+      placeholder.parentNode.insertBefore(button, placeholder);
+    });
+  }
+
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", init);
+  } else {
+    init();
+  }
+})();
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import json
+from collections import OrderedDict
+from itertools import islice
+from xml.sax.saxutils import quoteattr
+
+from .compat import iterate
+from .conf import settings
+from .rendering import SITEMAP_END, SITEMAP_START, render_entry
+from .tree import (
+    PAGE_VALUES,
+    filter_for_instance,
+    filter_for_root,
+    get_entries,
+    get_published_pages,
+    iter_annotated_entries,
+)
+
+
+# Markup of the XML export, mirroring the lists of the HTML sitemap.
+XML_START = '<?xml version="1.0" encoding="utf-8"?>\n<sitemap>'
+XML_OPEN_LIST = "<pages>"
+XML_NEXT_ITEM = "</page>"
+XML_PAGE = "\n<page url={0} title={1} path={2} depth=\"{3}\">"
+XML_CLOSE_LIST = "</page></pages>"
+XML_END = "</sitemap>\n"
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def iter_entries(pages, language, chunk_size):
+    """
+    Iterates over the given pages by chunks, yielding sitemap entries. The
+    titles are loaded using one query per chunk.
+    """
+    rows = iterate(pages.values_list(*PAGE_VALUES), chunk_size)
+    for chunk in iter_chunks(rows, chunk_size):
+        entries = get_entries(chunk, language)
+        for row in chunk:
+            yield entries[row[0]]
+
+
+def iter_sitemap_html(annotated_entries):
+    """
+    Incrementally renders the given annotated entries. The output is the same
+    as the one of the ``djangocms_htmlsitemap/sitemap.html`` template.
+    """
+    yield SITEMAP_START
+    for entry, info in annotated_entries:
+        yield render_entry(entry, info)
+    yield SITEMAP_END + "\n"
+
+
+def iter_sitemap_entries(instance, site, language, chunk_size=None, root_path=None):
+    """
+    Lazily yields the annotated entries of the sitemap of the given plugin
+    instance, as ``(entry, info)`` tuples. Pages are fetched by chunks and
+    annotated on the fly so that the memory used does not depend on the size
+    of the page tree. The whole tree (or branch, if a root path is given) is
+    always listed, regardless of the ``lazy_levels`` option.
+    """
+    if root_path is False:
+        return iter([])
+    pages = filter_for_instance(get_published_pages(site, language), instance)
+    if root_path:
+        pages = filter_for_root(pages, root_path)
+    entries = iter_entries(pages, language, chunk_size or settings.STREAM_CHUNK_SIZE)
+    return iter_annotated_entries(entries)
+
+
+def stream_sitemap(instance, site, language, chunk_size=None, root_path=None):
+    """
+    Renders the sitemap of the given plugin instance as an iterator of HTML
+    strings (see ``iter_sitemap_entries``).
+    """
+    return iter_sitemap_html(
+        iter_sitemap_entries(instance, site, language, chunk_size, root_path)
+    )
+
+
+def iter_levels(annotated_entries):
+    """
+    Yields ``(entry, level)`` tuples for the given annotated entries, where
+    ``level`` is the nesting level of the entry in the sitemap, starting at 0.
+    """
+    level = -1
+    for entry, info in annotated_entries:
+        if info.open:
+            level += 1
+        yield entry, level
+        level -= info.close_count
+
+
+def iter_sitemap_json(annotated_entries):
+    """
+    Incrementally serializes the given annotated entries as a JSON array of
+    objects listed in tree order. The nesting of the entries is given by
+    their ``level``.
+    """
+    separator = "["
+    for entry, level in iter_levels(annotated_entries):
+        yield separator + json.dumps(
+            OrderedDict(
+                [
+                    ("url", entry.url),
+                    ("title", entry.title),
+                    ("path", entry.path),
+                    ("depth", entry.depth),
+                    ("level", level),
+                ]
+            )
+        )
+        separator = ",\n"
+    yield "[]\n" if separator == "[" else "]\n"
+
+
+def iter_sitemap_xml(annotated_entries):
+    """
+    Incrementally serializes the given annotated entries as an XML document in
+    which the ``page`` elements are nested as in the sitemap.
+    """
+    yield XML_START
+    for entry, info in annotated_entries:
+        yield XML_OPEN_LIST if info.open else XML_NEXT_ITEM
+        yield XML_PAGE.format(
+            quoteattr(entry.url),
+            quoteattr(entry.title),
+            quoteattr(entry.path),
+            entry.depth,
+        )
+        yield XML_CLOSE_LIST * info.close_count
+    yield XML_END
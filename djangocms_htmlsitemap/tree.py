@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.translation import override
+
+from cms.constants import PUBLISHER_STATE_PENDING
+from cms.models.pagemodel import Page
+from cms.models.titlemodels import Title
+
+from .compat import DJANGO_CMS_35
+from .instrumentation import count_rows, measure
+
+
+class TreeProvider(object):
+    """
+    Gives access to the tree of the pages whatever the version of django CMS.
+    Since django CMS 3.5, the tree is made of nodes shared by the draft and
+    public versions of a page, which refer to them through the given field.
+    Pages are the nodes of the tree themselves before.
+
+    Either way, sitemaps are built from a single query on pages ordered by
+    the path of their node, from which nesting is derived in O(n) (see
+    ``iter_nesting``).
+    """
+
+    def __init__(self, node_field=None):
+        self.node_field = node_field
+        prefix = node_field + "__" if node_field else ""
+        self.site_column = prefix + "site"
+        self.path_column = prefix + "path"
+        self.depth_column = prefix + "depth"
+        if node_field:
+            self.node_model = Page._meta.get_field(node_field).related_model
+        else:  # pragma: no cover
+            self.node_model = Page
+
+    def get_node(self, page):
+        """
+        Returns the tree node holding the path and the depth of the given page.
+        """
+        return getattr(page, self.node_field) if self.node_field else page
+
+    def select_nodes(self, pages):
+        """
+        Makes the given queryset of pages fetch their tree nodes.
+        """
+        return pages.select_related(self.node_field) if self.node_field else pages
+
+    def get_public_nodes(self, site_id):
+        """
+        Returns a queryset of the tree nodes of the public pages of the given
+        site, or of all its pages if nodes are shared.
+        """
+        nodes = self.node_model.objects.filter(site=site_id)
+        if not self.node_field:  # pragma: no cover
+            nodes = nodes.filter(publisher_is_draft=False)
+        return nodes
+
+
+tree_provider = TreeProvider("node" if DJANGO_CMS_35 else None)
+
+TreeNode = tree_provider.node_model
+
+SITE_COLUMN = tree_provider.site_column
+PATH_COLUMN = tree_provider.path_column
+DEPTH_COLUMN = tree_provider.depth_column
+
+
+# Values of the pages from which sitemap entries are built (see get_entries).
+PAGE_VALUES = ("pk", "is_home", PATH_COLUMN, DEPTH_COLUMN, "in_navigation")
+
+
+@python_2_unicode_compatible
+class SitemapEntry(object):
+    """
+    A ready-to-render sitemap entry. Once annotated (see
+    ``iter_annotated_entries``), an entry also holds the information needed to
+    render the lists around it: it can be used as the ``info`` of the
+    ``(entry, info)`` tuples given to the templates, ``close`` having one
+    element per list to close after the entry.
+
+    Entries stand for the pages previously given to the templates: they are
+    rendered as their title and ``get_absolute_url`` returns their URL.
+    """
+
+    __slots__ = (
+        "url",
+        "title",
+        "path",
+        "depth",
+        "open",
+        "close_count",
+        "subtree_url",
+    )
+
+    def __init__(self, url, title, path, depth):
+        self.url = url
+        self.title = title
+        self.path = path
+        self.depth = depth
+        self.open = True
+        self.close_count = 0
+        self.subtree_url = None
+
+    @property
+    def close(self):
+        return range(self.close_count)
+
+    def get_absolute_url(self):
+        return self.url
+
+    def __eq__(self, other):
+        return isinstance(other, SitemapEntry) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __str__(self):
+        return self.title
+
+    def __repr__(self):
+        return "<SitemapEntry {0}>".format(self.path)
+
+
+def get_node(page):
+    """
+    Returns the tree node holding the path and the depth of the given page.
+    """
+    return tree_provider.get_node(page)
+
+
+def filter_publication_dates(queryset):
+    """
+    Excludes the pages (or any model exposing the publication dates of pages)
+    whose publication has not started yet or has ended.
+    """
+    now = timezone.now()
+    return queryset.filter(
+        Q(publication_date__lte=now) | Q(publication_date__isnull=True),
+        Q(publication_end_date__gt=now) | Q(publication_end_date__isnull=True),
+    )
+
+
+def get_displayable_pages(login_required=False, scheduled=False):
+    """
+    Returns a queryset of all the public pages that can be displayed in a
+    sitemap, whatever their site and language. Pages requiring a login are
+    only included if ``login_required`` is ``None``. Pages whose publication
+    has not started yet or has ended are only included if ``scheduled`` is
+    true.
+    """
+    pages = (
+        Page.objects.public()
+        .filter(pk__in=Title.objects.filter(published=True).values("page"))
+        .exclude(
+            pk__in=Title.objects.filter(
+                publisher_state=PUBLISHER_STATE_PENDING
+            ).values("page")
+        )
+    )
+    if not scheduled:
+        pages = filter_publication_dates(pages)
+    if login_required is not None:
+        pages = pages.filter(login_required=login_required)
+    return pages
+
+
+def get_published_pages(site, language, login_required=False, scheduled=False):
+    """
+    Returns a queryset of all the public pages of the given site that can be
+    displayed in a sitemap for the given language, ordered by tree path (see
+    ``get_displayable_pages`` for the other arguments).
+
+    This is equivalent to filtering ``Page.objects.public().published(site)``
+    on the language of the titles, but relies on semi-join subqueries on the
+    titles table rather than on joins so that no ``DISTINCT`` is required.
+    """
+    pages = (
+        get_displayable_pages(login_required, scheduled)
+        .filter(**{SITE_COLUMN: site})
+        .filter(pk__in=Title.objects.filter(language=language).values("page"))
+        .order_by(PATH_COLUMN)
+    )
+    return tree_provider.select_nodes(pages)
+
+
+def get_published_titles(site_ids, languages):
+    """
+    Returns a queryset of the titles of all the pages of the given sites that
+    can be displayed in a sitemap for the given languages, ordered by site,
+    language and tree path of their page.
+    """
+    pages = get_displayable_pages().filter(**{SITE_COLUMN + "__in": site_ids})
+    return Title.objects.filter(
+        language__in=languages, page__in=pages.values("pk")
+    ).order_by("page__" + SITE_COLUMN + "__pk", "language", "page__" + PATH_COLUMN)
+
+
+def filter_for_instance(queryset, instance, depth_column=DEPTH_COLUMN):
+    """
+    Applies the depth and navigation filters of the given plugin instance to a
+    queryset of pages (or of any model exposing a depth and an
+    ``in_navigation`` field).
+    """
+    queryset = queryset.filter(**{depth_column + "__gte": instance.min_depth})
+    if instance.max_depth:
+        queryset = queryset.filter(**{depth_column + "__lte": instance.max_depth})
+    if instance.in_navigation is not None:
+        queryset = queryset.filter(in_navigation=instance.in_navigation)
+    return queryset
+
+
+def filter_for_root(
+    queryset, root_path, path_column=PATH_COLUMN, depth_column=DEPTH_COLUMN
+):
+    """
+    Restricts a queryset of pages (or of any model exposing a path and a depth)
+    to the descendants of the node with the given path.
+    """
+    return queryset.filter(
+        **{
+            path_column + "__startswith": root_path,
+            depth_column + "__gt": len(root_path) // TreeNode.steplen,
+        }
+    )
+
+
+def annotate_pages(pages):
+    """
+    Returns a list of ``(page, info)`` tuples where ``info`` indicates whether
+    a list should be opened before the page and how many lists should be closed
+    after it.
+    """
+    return list(iter_annotated((page, get_node(page).path) for page in pages))
+
+
+def iter_annotated(items):
+    """
+    Lazily annotates an iterable of ``(obj, path)`` tuples ordered by tree
+    path, yielding ``(obj, info)`` tuples similar to the ones returned by
+    treebeard's ``get_annotated_list_qs``: ``info["open"]`` tells whether a
+    new list must be opened before the item and ``info["close"]`` holds one
+    element per list to close after it.
+    """
+    for obj, opened, closed, level in iter_nesting(items):
+        yield obj, {"open": opened, "close": list(range(closed)), "level": level}
+
+
+def iter_annotated_entries(entries):
+    """
+    Lazily annotates an iterable of sitemap entries ordered by tree path,
+    yielding ``(entry, info)`` tuples in which ``info`` is the annotated entry
+    itself.
+    """
+    for entry, opened, closed, level in iter_nesting(
+        (entry, entry.path) for entry in entries
+    ):
+        entry.open = opened
+        entry.close_count = closed
+        yield entry, entry
+
+
+class AnnotatedEntries(object):
+    """
+    A read-only sequence of ``(entry, info)`` tuples over a list of annotated
+    sitemap entries, each entry being its own ``info``. It lets the templates
+    get the same list of entries as ``pages`` and ``annotated_pages`` without
+    building a second list.
+    """
+
+    __slots__ = ("entries",)
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        for entry in self.entries:
+            yield entry, entry
+
+    def __getitem__(self, index):
+        entry = self.entries[index]
+        return entry, entry
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+
+def get_entry_list(annotated_entries):
+    """
+    Returns the list of the entries of the given ``(entry, info)`` tuples, to
+    be shared through ``AnnotatedEntries``.
+    """
+    return [entry for entry, info in annotated_entries]
+
+
+def iter_nesting(items):
+    """
+    Lazily computes the nesting of an iterable of ``(obj, path)`` tuples
+    ordered by tree path, yielding ``(obj, open, close, level)`` tuples where
+    ``open`` tells whether a new list must be opened before the item and
+    ``close`` is the number of lists to close after it.
+
+    Nesting is derived from the paths rather than from the depths, so the
+    markup stays balanced when intermediate levels have been filtered out
+    (eg. pages that are not in navigation): an item is nested under the
+    closest previous item that is one of its ancestors, if any. This runs in
+    O(n) and only holds the chain of open ancestors in memory.
+    """
+    # Paths of the items whose list element is still open, from the outermost
+    # to the innermost one. Each of them is an ancestor of the next one.
+    stack = []
+    push, pop = stack.append, stack.pop
+    previous = None
+    for obj, path in items:
+        popped = 0
+        while stack and not path.startswith(stack[-1]):
+            pop()
+            popped += 1
+        if previous is not None:
+            # When more than one list element was closed, the item replaces
+            # the last popped one in its list and every list nested deeper is
+            # complete.
+            yield previous[0], previous[1], max(popped - 1, 0), previous[2]
+        previous = (obj, not popped, len(stack))
+        push(path)
+    if previous is not None:
+        yield previous[0], previous[1], len(stack), previous[2]
+
+
+def get_page_url(is_home, path, slug, language):
+    """
+    Returns the URL of a CMS page from its title values. This mirrors the
+    behaviour of ``Page.get_absolute_url`` without requiring the title objects
+    to be loaded on the page instance.
+    """
+    with override(language):
+        if is_home:
+            return reverse("pages-root")
+        return reverse("pages-details-by-slug", kwargs={"slug": path or slug})
+
+
+def get_entries(rows, language):
+    """
+    Returns a dictionary of ready-to-render sitemap entries keyed by page IDs,
+    from rows holding the ``PAGE_VALUES`` of pages. The titles of all the
+    pages are loaded using a single query.
+    """
+    rows = {row[0]: row for row in rows}
+    titles = Title.objects.filter(page__in=list(rows), language=language).values_list(
+        "page_id", "slug", "path", "title", "menu_title"
+    )
+    entries = {}
+    for page_id, slug, path, title, menu_title in titles:
+        pk, is_home, node_path, depth = rows[page_id][:4]
+        entries[page_id] = SitemapEntry(
+            get_page_url(is_home, path, slug, language),
+            menu_title or title,
+            node_path,
+            depth,
+        )
+    return entries
+
+
+def annotate_page_entries(pages, language):
+    """
+    Returns a list of ``(entry, info)`` tuples for the given queryset of
+    pages. Only the values needed to build the entries are fetched.
+    """
+    with measure("query"):
+        rows = list(pages.values_list(*PAGE_VALUES))
+        entries = get_entries(rows, language)
+    count_rows(len(rows))
+    with measure("annotation"):
+        return list(iter_annotated_entries(entries[row[0]] for row in rows))
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.conf.urls import url
+
+from . import views
+
+
+app_name = "djangocms_htmlsitemap"
+
+urlpatterns = [
+    url(r"^(?P<pk>\d+)/$", views.sitemap, name="sitemap"),
+    url(r"^(?P<pk>\d+)/stream/$", views.sitemap_stream, name="sitemap_stream"),
+    url(r"^(?P<pk>\d+)/json/$", views.sitemap_json, name="sitemap_json"),
+    url(r"^(?P<pk>\d+)/(?P<path>[0-9A-Z]+)/$", views.subtree, name="subtree"),
+]
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.contrib.sites.shortcuts import get_current_site
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+
+from .cache import (
+    get_cached_sitemap,
+    get_sitemap_cache_key,
+    get_tree_version,
+    set_cached_sitemap,
+)
+from .conf import settings
+from .engine import (
+    get_annotated_entries,
+    get_last_modified,
+    get_menu_page_tree,
+    get_root_path,
+    get_visible_page_tree,
+    slice_page_tree,
+)
+from .models import HtmlSitemapPluginConf
+from .permissions import get_permission_fingerprint
+from .rendering import SUBTREE_TEMPLATE, can_render_fast, render_tree
+from .streaming import iter_sitemap_entries, iter_sitemap_json, stream_sitemap
+
+
+def get_request_language(request):
+    return getattr(request, "LANGUAGE_CODE", None) or get_language()
+
+
+def conditional_fragment(view):
+    """
+    Decorates a view rendering a sitemap fragment so that it sends ``ETag`` and
+    ``Last-Modified`` headers and answers conditional requests with a 304
+    response without rendering the fragment. The ETag depends on the plugin
+    configuration and on the version of the page tree, while the modification
+    date is the one of the latest change of the listed pages (see
+    ``get_last_modified``).
+
+    Fragments listing the section of the current page cannot be requested.
+    """
+
+    @wraps(view)
+    def wrapper(request, pk, *args, **kwargs):
+        instance = get_object_or_404(HtmlSitemapPluginConf, pk=pk)
+        # Sections depend on the current page, which is unknown outside of
+        # pages: only their subtrees, given by their path, can be requested.
+        path = kwargs.get("path")
+        if not path and instance.section_depth and not instance.root_page_id:
+            raise Http404("Sections are only rendered within pages.")
+        site = get_current_site(request)
+        language = get_request_language(request)
+
+        fingerprint = None
+        if settings.VIEW_PERMISSIONS:
+            fingerprint = get_permission_fingerprint(request.user, site)
+
+        last_modified = get_last_modified(
+            instance, site, language, path or get_root_path(instance)
+        )
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+        etag = quote_etag(
+            hashlib.md5(
+                ":".join(
+                    [
+                        get_sitemap_cache_key(
+                            instance, site.pk, language, fingerprint=fingerprint
+                        ),
+                        get_tree_version(site.pk),
+                        str(timestamp),
+                    ]
+                    + list(args)
+                    + [str(value) for value in kwargs.values()]
+                ).encode("utf-8")
+            ).hexdigest()
+        )
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = view(request, instance, site, language, *args, **kwargs)
+
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        if settings.FRAGMENT_MAX_AGE is not None:
+            # Fragments depending on the permissions of the user must not be
+            # stored by shared caches.
+            options = {"public": True} if fingerprint is None else {"private": True}
+            options["max_age"] = settings.FRAGMENT_MAX_AGE
+            patch_cache_control(response, **options)
+        return response
+
+    return wrapper
+
+
+@conditional_fragment
+def sitemap(request, instance, site, language):
+    """
+    Renders the HTML fragment of the sitemap of the given plugin instance
+    exactly as the plugin embeds it in pages, from the same cached entries. The
+    rendered fragment is cached as well, unless it is built from the menu
+    nodes, which depend on the user.
+    """
+    plugin = instance.get_plugin_class_instance()
+    if settings.MENU_NODES:
+        return HttpResponse(plugin.render_fragment(request, instance, site, language))
+
+    fingerprint = None
+    if settings.VIEW_PERMISSIONS:
+        fingerprint = get_permission_fingerprint(request.user, site)
+
+    version, html = get_cached_sitemap(
+        instance, site.pk, language, fingerprint=fingerprint, kind="fragment"
+    )
+    if html is None:
+        html = plugin.render_fragment(request, instance, site, language)
+        set_cached_sitemap(
+            instance,
+            site.pk,
+            language,
+            version,
+            html,
+            fingerprint=fingerprint,
+            kind="fragment",
+        )
+    return HttpResponse(html)
+
+
+@conditional_fragment
+def sitemap_stream(request, instance, site, language):
+    """
+    Streams the HTML fragment of the sitemap of the given plugin instance,
+    loading its pages by chunks. Unlike ``sitemap``, the fragment is neither
+    cached nor built from the menu nodes or the snapshots, the pages requiring
+    a login are never listed, deeper levels are never deferred (see
+    ``lazy_levels``) and the templates of the application are always used, as
+    if they were not overridden.
+    """
+    return StreamingHttpResponse(
+        stream_sitemap(instance, site, language, root_path=get_root_path(instance)),
+        content_type="text/html; charset=utf-8",
+    )
+
+
+@conditional_fragment
+def sitemap_json(request, instance, site, language):
+    """
+    Streams the entries of the sitemap of the given plugin instance as JSON.
+    """
+    return StreamingHttpResponse(
+        iter_sitemap_json(
+            iter_sitemap_entries(
+                instance, site, language, root_path=get_root_path(instance)
+            )
+        ),
+        content_type="application/json",
+    )
+
+
+@conditional_fragment
+def subtree(request, instance, site, language, path):
+    """
+    Renders the HTML fragment listing the descendants of the node with the given
+    path, for plugin instances whose deeper levels are loaded on demand.
+    """
+    if settings.MENU_NODES:
+        tree = get_menu_page_tree(request)
+        annotated_pages = slice_page_tree(tree, instance, path)
+    elif settings.VIEW_PERMISSIONS:
+        tree = get_visible_page_tree(request, site, language)
+        annotated_pages = slice_page_tree(tree, instance, path)
+    else:
+        annotated_pages = get_annotated_entries(instance, site, language, path)
+    if can_render_fast(SUBTREE_TEMPLATE):
+        return HttpResponse(render_tree(annotated_pages))
+    return TemplateResponse(
+        request,
+        SUBTREE_TEMPLATE,
+        {"instance": instance, "annotated_pages": annotated_pages},
+    )
@@ -17,7 +17,7 @@ setup(
     version="0.6.0",
     author="Kapt",
     author_email="dev@kapt.mobi",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     include_package_data=True,
     url="https://github.com/kapt-labs/djangocms-htmlsitemap",
     license="BSD",
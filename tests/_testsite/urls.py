@@ -11,6 +11,10 @@ from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 
 admin.autodiscover()
 
-urlpatterns = [url(r"admin/", admin.site.urls), url(r"", include("cms.urls"))]
+urlpatterns = [
+    url(r"admin/", admin.site.urls),
+    url(r"^sitemap/", include("djangocms_htmlsitemap.urls")),
+    url(r"", include("cms.urls")),
+]
 
 urlpatterns += staticfiles_urlpatterns()
@@ -0,0 +1,152 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.template import RequestContext
+from django.test.client import RequestFactory
+from django.utils.translation import activate
+
+import pytest
+from cms import __version__
+from cms.api import create_page
+
+
+def get_cms_version():
+    return tuple(map(lambda i: int(i), __version__.split(".")))
+
+
+if get_cms_version() >= (3, 4):
+    from cms.plugin_rendering import ContentRenderer
+
+
+class CMSPagesTestMixin(object):
+    @pytest.fixture(autouse=True)
+    def setup_cms(self):
+        # Clears the sitemaps cached by previous tests
+        cache.clear()
+
+        # Creates a request
+        self.request = self.get_request()
+        activate(self.request.LANGUAGE_CODE)
+
+        # Creates a test user
+        self.user = User.objects.create(
+            username="testuser", is_active=True, is_superuser=True
+        )
+
+        # Creates a basic tree of CMS pages
+        self.index_page = create_page(
+            "Index", "index.html", "en", published=True, in_navigation=True
+        )  # noq
+
+        try:
+            # django-cms 3.5+
+            self.index_page.set_as_homepage()
+        except AttributeError:
+            # django-cms < 3.5 defaults the first page as being the home page
+            pass
+
+        self.depth2_page1 = create_page(
+            "Depth 2 page 1",
+            "simple.html",
+            "en",
+            in_navigation=True,
+            published=True,
+            parent=self.index_page,
+        )
+        self.depth2_page2 = create_page(
+            "Depth 2 page 2",
+            "simple.html",
+            "en",
+            in_navigation=False,
+            published=True,
+            parent=self.index_page,
+        )
+        self.depth3_page1 = create_page(
+            "Depth 3 page 1",
+            "simple.html",
+            "en",
+            in_navigation=False,
+            published=True,
+            parent=self.depth2_page2,
+        )
+        self.depth3_page2 = create_page(
+            "Depth 3 page 2",
+            "simple.html",
+            "en",
+            in_navigation=False,
+            published=True,
+            parent=self.depth2_page2,
+        )
+        self.depth2_page3 = create_page(
+            "Depth 2 page 3",
+            "simple.html",
+            "en",
+            in_navigation=False,
+            published=True,
+            parent=self.index_page,
+        )
+        self.depth2_page4 = create_page(
+            "Depth 2 page 4",
+            "simple.html",
+            "en",
+            in_navigation=False,
+            published=True,
+            parent=self.index_page,
+        )
+        self.depth3_page3 = create_page(
+            "Depth 3 page 3",
+            "simple.html",
+            "en",
+            in_navigation=False,
+            published=True,
+            parent=self.depth2_page4,
+        )
+
+    def get_request(self):
+        factory = RequestFactory()
+
+        if settings.USE_I18N:
+            language = settings.LANGUAGES[0][0]
+        else:
+            language = settings.LANGUAGE_CODE
+
+        request = factory.get("/")
+        request.LANGUAGE_CODE = language
+        request.current_page = None
+        return request
+
+    def run_commit_hooks(self):
+        """
+        Runs the callbacks registered with ``transaction.on_commit``, as the
+        transaction wrapping each test is never committed.
+        """
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for sids, callback in callbacks:
+            callback()
+
+    def render_plugin(self, instance):
+        context = RequestContext(self.request, {"request": self.request})
+
+        if get_cms_version() >= (3, 4):
+            renderer = ContentRenderer(request=self.request)
+            return renderer.render_plugin(instance, context)
+        else:
+            return instance.render_plugin(context)
+
+    def render_placeholder(self, placeholder):
+        """
+        Renders the given placeholder as on a page, through the placeholder
+        cache of django CMS.
+        """
+        context = RequestContext(self.request, {"request": self.request})
+
+        if get_cms_version() >= (3, 4):
+            renderer = ContentRenderer(request=self.request)
+            return renderer.render_placeholder(placeholder, context, use_cache=True)
+        else:
+            return placeholder.render(context, None)
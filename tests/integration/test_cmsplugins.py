@@ -2,131 +2,55 @@
 
 from __future__ import unicode_literals
 
-from django.conf import settings
-from django.contrib.auth.models import User
-from django.template import RequestContext
-from django.test.client import RequestFactory
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.html import strip_spaces_between_tags
+from django.utils.six import StringIO
 from django.utils.translation import activate
 
 import pytest
-from cms import __version__
 from cms.api import add_plugin, create_page, create_title, publish_page
-from cms.models import Placeholder
+from cms.forms.fields import PageSelectFormField
+from cms.models import ACCESS_PAGE, Page, PagePermission, Placeholder, Title
 from djangocms_htmlsitemap import cms_plugins
+from djangocms_htmlsitemap.cache import get_cached_sitemap, get_tree_version
+from djangocms_htmlsitemap.engine import (
+    get_annotated_entries,
+    get_page_tree,
+    get_page_trees,
+    slice_page_tree,
+)
+from djangocms_htmlsitemap.indexes import (
+    get_existing_index_names,
+    get_sitemap_indexes,
+)
+from djangocms_htmlsitemap.instrumentation import get_metrics_backend
+from djangocms_htmlsitemap.models import HtmlSitemapSnapshotEntry
+from djangocms_htmlsitemap.prewarming import start_prewarm_thread
+from djangocms_htmlsitemap.rendering import FastSitemapTemplate
+from djangocms_htmlsitemap.signals import sitemap_rendered
+from djangocms_htmlsitemap.tree import get_entry_list, get_node
 
+from .base import CMSPagesTestMixin
 
-def get_cms_version():
-    return tuple(map(lambda i: int(i), __version__.split(".")))
-
-
-if get_cms_version() >= (3, 4):
-    from cms.plugin_rendering import ContentRenderer
+try:
+    from cms.operations import MOVE_PAGE
+    from cms.signals import post_obj_operation
+except ImportError:  # pragma: no cover
+    post_obj_operation = None
 
 
 @pytest.mark.django_db
-class TestHtmlSitemapPlugin(object):
-    @pytest.fixture(autouse=True)
-    def setup_cms(self):
-        # Creates a request
-        self.request = self.get_request()
-
-        # Creates a test user
-        self.user = User.objects.create(
-            username="testuser", is_active=True, is_superuser=True
-        )
-
-        # Creates a basic tree of CMS pages
-        self.index_page = create_page(
-            "Index", "index.html", "en", published=True, in_navigation=True
-        )  # noq
-
-        try:
-            # django-cms 3.5+
-            self.index_page.set_as_homepage()
-        except AttributeError:
-            # django-cms < 3.5 defaults the first page as being the home page
-            pass
-
-        self.depth2_page1 = create_page(
-            "Depth 2 page 1",
-            "simple.html",
-            "en",
-            in_navigation=True,
-            published=True,
-            parent=self.index_page,
-        )
-        self.depth2_page2 = create_page(
-            "Depth 2 page 2",
-            "simple.html",
-            "en",
-            in_navigation=False,
-            published=True,
-            parent=self.index_page,
-        )
-        self.depth3_page1 = create_page(
-            "Depth 3 page 1",
-            "simple.html",
-            "en",
-            in_navigation=False,
-            published=True,
-            parent=self.depth2_page2,
-        )
-        self.depth3_page2 = create_page(
-            "Depth 3 page 2",
-            "simple.html",
-            "en",
-            in_navigation=False,
-            published=True,
-            parent=self.depth2_page2,
-        )
-        self.depth2_page3 = create_page(
-            "Depth 2 page 3",
-            "simple.html",
-            "en",
-            in_navigation=False,
-            published=True,
-            parent=self.index_page,
-        )
-        self.depth2_page4 = create_page(
-            "Depth 2 page 4",
-            "simple.html",
-            "en",
-            in_navigation=False,
-            published=True,
-            parent=self.index_page,
-        )
-        self.depth3_page3 = create_page(
-            "Depth 3 page 3",
-            "simple.html",
-            "en",
-            in_navigation=False,
-            published=True,
-            parent=self.depth2_page4,
-        )
-
-    def get_request(self):
-        factory = RequestFactory()
-
-        if settings.USE_I18N:
-            language = settings.LANGUAGES[0][0]
-        else:
-            language = settings.LANGUAGE_CODE
-
-        request = factory.get("/")
-        request.LANGUAGE_CODE = language
-        request.current_page = None
-        return request
-
-    def render_plugin(self, instance):
-        context = RequestContext(self.request, {"request": self.request})
-
-        if get_cms_version() >= (3, 4):
-            renderer = ContentRenderer(request=self.request)
-            return renderer.render_plugin(instance, context)
-        else:
-            return instance.render_plugin(context)
-
+class TestHtmlSitemapPlugin(CMSPagesTestMixin):
     def test_can_render_a_simple_tree_of_cms_pages(self):
         # Setup
         placeholder = Placeholder.objects.create(slot="test")
@@ -388,3 +312,1203 @@ class TestHtmlSitemapPlugin(object):
             """
             ).strip()
         )
+
+    def test_renders_the_sitemap_with_a_constant_number_of_queries(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+
+        with CaptureQueriesContext(connection) as small_tree_queries:
+            self.render_plugin(model_instance)
+
+        for i in range(5):
+            parent = create_page(
+                "Depth 3 page {}".format(i + 4),
+                "simple.html",
+                "en",
+                published=True,
+                parent=self.depth2_page1,
+            )
+            create_page(
+                "Depth 4 page {}".format(i + 1),
+                "simple.html",
+                "en",
+                published=True,
+                parent=parent,
+            )
+        self.run_commit_hooks()
+
+        # Run
+        with CaptureQueriesContext(connection) as large_tree_queries:
+            html = self.render_plugin(model_instance)
+
+        # Check
+        assert "Depth 4 page 5" in html
+        assert len(large_tree_queries) == len(small_tree_queries)
+
+    def test_uses_the_menu_titles_of_the_pages_as_link_labels(self):
+        # Setup
+        create_page(
+            "Depth 3 page 4",
+            "simple.html",
+            "en",
+            menu_title="Menu title",
+            published=True,
+            parent=self.depth2_page1,
+        )
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", min_depth=3
+        )
+
+        # Run
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert (
+            '<a href="/depth-2-page-1/depth-3-page-4/" title="Menu title">Menu title</a>'
+            in html
+        )
+
+    def test_serves_cached_sitemaps_without_querying_the_database(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        plugin = model_instance.get_plugin_class_instance()
+        self.render_plugin(model_instance)
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            context = plugin.render(
+                {"request": self.request}, model_instance, placeholder
+            )
+
+        # Check
+        assert len(queries) == 0
+        assert len(context["annotated_pages"]) == 8
+
+    def test_reads_the_pages_once_and_shares_them_with_the_annotated_pages(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        plugin = model_instance.get_plugin_class_instance()
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            context = plugin.render(
+                {"request": self.request}, model_instance, placeholder
+            )
+
+        # Check
+        assert len(queries) == 1
+        assert len(context["pages"]) == 8
+        assert context["annotated_pages"].entries is context["pages"]
+        for page, (entry, info) in zip(context["pages"], context["annotated_pages"]):
+            assert page is entry is info
+
+    def test_invalidates_cached_sitemaps_when_a_page_is_unpublished(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        assert "Depth 2 page 3" in self.render_plugin(model_instance)
+
+        # Run
+        self.depth2_page3.unpublish("en")
+        self.run_commit_hooks()
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert "Depth 2 page 3" not in html
+
+    def test_invalidates_cached_sitemaps_once_the_change_is_committed(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        self.run_commit_hooks()
+        site_id = Site.objects.get_current().pk
+        version = get_tree_version(site_id)
+
+        # Run
+        self.depth2_page3.unpublish("en")
+        uncommitted_version = get_tree_version(site_id)
+        self.run_commit_hooks()
+
+        # Check
+        assert uncommitted_version == version
+        assert get_tree_version(site_id) != version
+        assert "Depth 2 page 3" not in self.render_plugin(model_instance)
+
+    def test_invalidates_cached_sitemaps_when_a_page_is_deleted(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        assert "Depth 2 page 3" in self.render_plugin(model_instance)
+
+        # Run
+        self.depth2_page3.delete()
+        self.run_commit_hooks()
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert "Depth 2 page 3" not in html
+
+    def test_can_render_a_sitemap_from_the_snapshot_table(self, settings):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", min_depth=2
+        )
+        expected_html = self.render_plugin(model_instance)
+        settings.HTMLSITEMAP_SNAPSHOTS = True
+        call_command("refresh_htmlsitemap_snapshots", stdout=StringIO())
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            html = self.render_plugin(model_instance)
+
+        # Check
+        assert html == expected_html
+        assert any(
+            HtmlSitemapSnapshotEntry._meta.db_table in query["sql"]
+            for query in queries
+        )
+        assert not any(Title._meta.db_table in query["sql"] for query in queries)
+
+    def test_refreshes_the_snapshot_table_when_a_page_is_published(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_SNAPSHOTS = True
+        call_command("refresh_htmlsitemap_snapshots", stdout=StringIO())
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+
+        # Run
+        create_page(
+            "Depth 3 page 4",
+            "simple.html",
+            "en",
+            published=True,
+            parent=self.depth2_page1,
+        )
+        self.depth2_page3.unpublish("en")
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert (
+            '<a href="/depth-2-page-1/depth-3-page-4/" title="Depth 3 page 4">'
+            in html
+        )
+        assert "Depth 2 page 3" not in html
+        assert HtmlSitemapSnapshotEntry.objects.filter(language="en").count() == 8
+
+    @pytest.mark.skipif(post_obj_operation is None, reason="No page operations")
+    def test_refreshes_the_snapshot_table_when_a_page_is_moved(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_SNAPSHOTS = True
+        call_command("refresh_htmlsitemap_snapshots", stdout=StringIO())
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+
+        # Run
+        # Moving the page renumbers the paths of its new siblings.
+        self.depth2_page4.move_page(self.index_page.node, "first-child")
+        post_obj_operation.send(
+            sender=Page,
+            operation=MOVE_PAGE,
+            request=self.request,
+            token="token",
+            obj=self.depth2_page4,
+        )
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert HtmlSitemapSnapshotEntry.objects.filter(language="en").count() == 8
+        settings.HTMLSITEMAP_SNAPSHOTS = False
+        cache.clear()
+        assert html == self.render_plugin(model_instance)
+        assert html.index("Depth 2 page 4") < html.index("Depth 2 page 1")
+
+    def test_refreshes_the_snapshot_table_when_a_page_is_inserted(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_SNAPSHOTS = True
+        call_command("refresh_htmlsitemap_snapshots", stdout=StringIO())
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+
+        # Run
+        # Inserting the page renumbers the paths of its next siblings.
+        create_page(
+            "Depth 2 page 0",
+            "simple.html",
+            "en",
+            published=True,
+            parent=self.index_page,
+            position="first-child",
+        )
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert HtmlSitemapSnapshotEntry.objects.filter(language="en").count() == 9
+        settings.HTMLSITEMAP_SNAPSHOTS = False
+        cache.clear()
+        assert html == self.render_plugin(model_instance)
+
+    def test_locks_the_site_before_refreshing_the_snapshot_table(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_SNAPSHOTS = True
+        call_command("refresh_htmlsitemap_snapshots", stdout=StringIO())
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            self.depth2_page1.publish("en")
+
+        # Check
+        sql = [query["sql"] for query in queries]
+        snapshot_queries = [
+            index
+            for index, query in enumerate(sql)
+            if HtmlSitemapSnapshotEntry._meta.db_table in query
+        ]
+        assert any(
+            Site._meta.db_table in query for query in sql[: snapshot_queries[0]]
+        )
+
+    def test_checks_the_publication_dates_of_the_snapshot_entries(
+        self, settings, monkeypatch
+    ):
+        # Setup
+        settings.HTMLSITEMAP_SNAPSHOTS = True
+        now = timezone.now()
+        Page.objects.filter(pk=self.depth2_page1.publisher_public_id).update(
+            publication_date=now + timedelta(hours=1)
+        )
+        Page.objects.filter(pk=self.depth2_page3.publisher_public_id).update(
+            publication_end_date=now + timedelta(hours=1)
+        )
+        call_command("refresh_htmlsitemap_snapshots", stdout=StringIO())
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        html = self.render_plugin(model_instance)
+
+        # Run
+        cache.clear()
+        monkeypatch.setattr(timezone, "now", lambda: now + timedelta(hours=2))
+        later_html = self.render_plugin(model_instance)
+
+        # Check
+        assert "Depth 2 page 1" not in html
+        assert "Depth 2 page 3" in html
+        assert "Depth 2 page 1" in later_html
+        assert "Depth 2 page 3" not in later_html
+
+    def test_lists_pages_translated_in_several_languages_only_once(self):
+        # Setup
+        create_title("fr", "Index fr", self.index_page)
+        create_title("fr", "Niveau 2 Page 1", self.depth2_page1)
+        publish_page(self.index_page, self.user, "fr")
+        publish_page(self.depth2_page1, self.user, "fr")
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            html = self.render_plugin(model_instance)
+
+        # Check
+        assert html.count('title="Index"') == 1
+        assert html.count('title="Depth 2 page 1"') == 1
+        assert not any("DISTINCT" in query["sql"] for query in queries)
+
+    def test_can_render_pages_in_navigation_below_pages_that_are_not(self):
+        # Setup
+        create_page(
+            "Depth 3 page 4",
+            "simple.html",
+            "en",
+            in_navigation=True,
+            published=True,
+            parent=self.depth2_page2,
+        )
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", in_navigation=True
+        )
+
+        # Run
+        html = self.render_plugin(model_instance)
+        html = strip_spaces_between_tags(html)
+
+        # Check
+        assert html.strip() == strip_spaces_between_tags(
+            """
+            <div id="sitemap">
+                <ul>
+                    <li>
+                        <a href="/" title="Index">Index</a>
+                        <ul>
+                            <li><a href="/depth-2-page-1/" title="Depth 2 page 1">Depth 2 page 1</a></li>
+                            <li><a href="/depth-2-page-2/depth-3-page-4/" title="Depth 3 page 4">Depth 3 page 4</a></li>
+                        </ul>
+                    </li>
+                </ul>
+            </div>
+        """
+        ).strip()
+
+    @pytest.mark.parametrize("menu_nodes", [False, True])
+    def test_renders_all_the_levels_if_the_urls_of_the_app_are_not_included(
+        self, settings, menu_nodes
+    ):
+        # Setup
+        settings.ROOT_URLCONF = "cms.urls"
+        settings.HTMLSITEMAP_MENU_NODES = menu_nodes
+        self.request.user = AnonymousUser()
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", lazy_levels=1
+        )
+
+        # Run
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert html.count("<a href=") == 8
+        assert "data-htmlsitemap-subtree" not in html
+
+    def test_can_render_the_first_levels_of_a_tree_and_defer_the_deeper_ones(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", lazy_levels=2
+        )
+        depth2_page2_url = reverse(
+            "djangocms_htmlsitemap:subtree",
+            args=[
+                model_instance.pk,
+                get_node(self.depth2_page2.get_public_object()).path,
+            ],
+        )
+        depth2_page4_url = reverse(
+            "djangocms_htmlsitemap:subtree",
+            args=[
+                model_instance.pk,
+                get_node(self.depth2_page4.get_public_object()).path,
+            ],
+        )
+
+        # Run
+        html = self.render_plugin(model_instance)
+        html = strip_spaces_between_tags(html)
+
+        # Check
+        assert html.strip() == strip_spaces_between_tags(
+            """
+            <div id="sitemap">
+                <ul>
+                    <li>
+                        <a href="/" title="Index">Index</a>
+                        <ul>
+                            <li><a href="/depth-2-page-1/" title="Depth 2 page 1">Depth 2 page 1</a></li>
+                            <li>
+                                <a href="/depth-2-page-2/" title="Depth 2 page 2">Depth 2 page 2</a><div data-htmlsitemap-subtree="{0}"></div>
+                            </li>
+                            <li><a href="/depth-2-page-3/" title="Depth 2 page 3">Depth 2 page 3</a></li>
+                            <li>
+                                <a href="/depth-2-page-4/" title="Depth 2 page 4">Depth 2 page 4</a><div data-htmlsitemap-subtree="{1}"></div>
+                            </li>
+                        </ul>
+                    </li>
+                </ul>
+            </div><script src="/static/djangocms_htmlsitemap/js/sitemap.js" defer></script>
+        """.format(
+                depth2_page2_url, depth2_page4_url
+            )
+        ).strip()
+
+    def test_does_not_collect_render_metrics_by_default(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        plugin = model_instance.get_plugin_class_instance()
+
+        # Run
+        context = plugin.render({"request": self.request}, model_instance, placeholder)
+
+        # Check
+        assert context["htmlsitemap_metrics"] is None
+
+    def test_records_render_metrics_in_the_configured_backend(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_METRICS_BACKEND = (
+            "djangocms_htmlsitemap.instrumentation.InMemoryMetricsBackend"
+        )
+        backend = get_metrics_backend()
+        backend.clear()
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+
+        # Run
+        self.render_plugin(model_instance)
+        self.render_plugin(model_instance)
+
+        # Check
+        cold, warm = backend.records
+        assert cold.instance == model_instance
+        assert cold.language == "en"
+        assert cold.cache_hit is False
+        assert cold.rows == 8
+        assert cold.queries > 0
+        assert set(cold.timings) == {"query", "annotation", "template", "total"}
+        assert warm.cache_hit is True
+        assert warm.rows == 0
+        assert warm.queries == 0
+        assert set(warm.timings) == {"template", "total"}
+
+    def test_sends_render_metrics_with_the_sitemap_rendered_signal(self):
+        # Setup
+        received = []
+
+        def receiver(sender, metrics, **kwargs):
+            received.append(metrics.as_dict())
+
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", min_depth=3
+        )
+        sitemap_rendered.connect(receiver)
+
+        # Run
+        try:
+            html = self.render_plugin(model_instance)
+        finally:
+            sitemap_rendered.disconnect(receiver)
+
+        # Check
+        assert "Depth 3 page 1" in html
+        assert len(received) == 1
+        assert received[0]["instance"] == model_instance.pk
+        assert received[0]["cache_hit"] is False
+        # The whole page tree is fetched and sliced in memory.
+        assert received[0]["rows"] == 8
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {},
+            {"min_depth": 2},
+            {"max_depth": 2},
+            {"in_navigation": True},
+            {"lazy_levels": 1},
+        ],
+    )
+    def test_fast_renderer_produces_the_same_output_as_the_template(
+        self, settings, options
+    ):
+        # Setup
+        create_page(
+            'Depth 3 page <4> & "co"',
+            "simple.html",
+            "en",
+            published=True,
+            parent=self.depth2_page1,
+        )
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", **options
+        )
+        expected_html = self.render_plugin(model_instance)
+        settings.HTMLSITEMAP_FAST_RENDERER = True
+        plugin = model_instance.get_plugin_class_instance()
+
+        # Run
+        html = self.render_plugin(model_instance)
+
+        # Check
+        template = plugin.get_render_template({}, model_instance, placeholder)
+        assert isinstance(template, FastSitemapTemplate)
+        assert html == expected_html
+
+    def test_can_render_templates_written_for_pages(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        plugin = model_instance.get_plugin_class_instance()
+        # Project templates may render the entries as the pages they used to be.
+        template = Template(
+            "{% for page, info in annotated_pages %}"
+            '<a href="{{ page.get_absolute_url }}" title="{{ page }}">{{ page }}</a>'
+            "{% endfor %}"
+            "{% for page in pages %}{{ page }}{% endfor %}"
+        )
+
+        # Run
+        context = plugin.render(
+            {"request": self.request}, model_instance, placeholder
+        )
+        html = template.render(Context(context))
+
+        # Check
+        assert (
+            '<a href="/depth-2-page-1/" title="Depth 2 page 1">Depth 2 page 1</a>'
+            in html
+        )
+        assert html.endswith("Depth 2 page 4Depth 3 page 3")
+
+    def test_fast_renderer_is_not_used_when_the_template_is_overridden(
+        self, settings, tmpdir
+    ):
+        # Setup
+        tmpdir.mkdir("djangocms_htmlsitemap").join("sitemap.html").write(
+            "{% for entry in pages %}{{ entry.title }};{% endfor %}"
+        )
+        settings.TEMPLATES = [dict(settings.TEMPLATES[0], DIRS=[str(tmpdir)])]
+        settings.HTMLSITEMAP_FAST_RENDERER = True
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", min_depth=3
+        )
+
+        # Run
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert html == "Depth 3 page 1;Depth 3 page 2;Depth 3 page 3;"
+
+    def test_shares_the_page_tree_between_the_sitemaps_of_a_request(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        footer_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", max_depth=2
+        )
+        section_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", min_depth=3
+        )
+        self.render_plugin(footer_instance)
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            html = self.render_plugin(section_instance)
+
+        # Check
+        assert "Depth 3 page 1" in html
+        assert "Depth 2 page 1" not in html
+        assert not any(Title._meta.db_table in query["sql"] for query in queries)
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {},
+            {"min_depth": 2},
+            {"max_depth": 2},
+            {"min_depth": 2, "max_depth": 2},
+            {"in_navigation": True},
+            {"in_navigation": False},
+            {"lazy_levels": 1},
+            {"min_depth": 2, "lazy_levels": 1},
+            {"in_navigation": True, "lazy_levels": 1},
+        ],
+    )
+    def test_slices_the_page_tree_like_the_database_queries(self, options):
+        # Setup
+        # This page is listed below pages that are not in navigation.
+        create_page(
+            "Depth 4 page 1",
+            "simple.html",
+            "en",
+            in_navigation=True,
+            published=True,
+            parent=self.depth3_page1,
+        )
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", **options
+        )
+        site = Site.objects.get_current()
+
+        # Run
+        annotated_entries = slice_page_tree(get_page_tree(site, "en"), model_instance)
+
+        # Check
+        assert annotated_entries == get_annotated_entries(model_instance, site, "en")
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {},
+            {"min_depth": 2},
+            {"max_depth": 2},
+            {"in_navigation": True},
+            {"in_navigation": False},
+        ],
+    )
+    def test_can_render_a_sitemap_from_the_menu_nodes(self, settings, options):
+        # Setup
+        self.request.user = AnonymousUser()
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", **options
+        )
+        expected_html = self.render_plugin(model_instance)
+        settings.HTMLSITEMAP_MENU_NODES = True
+        self.render_plugin(model_instance)
+        del self.request._htmlsitemap_menu_tree
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            html = self.render_plugin(model_instance)
+
+        # Check
+        assert html == expected_html
+        assert not any(Title._meta.db_table in query["sql"] for query in queries)
+
+    @pytest.mark.parametrize(
+        "options", [{}, {"min_depth": 2}, {"max_depth": 2}, {"min_depth": 1}]
+    )
+    def test_can_render_a_sitemap_from_the_menu_nodes_below_a_hidden_home_page(
+        self, settings, options
+    ):
+        # Setup
+        self.index_page.in_navigation = False
+        self.index_page.save()
+        self.index_page.publish("en")
+        create_page(
+            "Other root", "simple.html", "en", in_navigation=True, published=True
+        )
+        self.request.user = AnonymousUser()
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", **options
+        )
+        expected_html = self.render_plugin(model_instance)
+        settings.HTMLSITEMAP_MENU_NODES = True
+
+        # Run
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert html == expected_html
+
+    def test_prewarms_cached_sitemaps_when_a_page_is_published(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_PREWARM = "sync"
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        plugin = model_instance.get_plugin_class_instance()
+
+        # Run
+        create_page(
+            "Depth 3 page 4",
+            "simple.html",
+            "en",
+            published=True,
+            parent=self.depth2_page1,
+        )
+        self.run_commit_hooks()
+
+        # Check
+        with CaptureQueriesContext(connection) as queries:
+            context = plugin.render(
+                {"request": self.request}, model_instance, placeholder
+            )
+        assert len(queries) == 0
+        assert "Depth 3 page 4" in [entry.title for entry in context["pages"]]
+
+    def test_only_reads_the_changed_branch_again_to_prewarm_sitemaps(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_PREWARM = "sync"
+        settings.HTMLSITEMAP_BRANCH_DEPTH = 2
+        placeholder = Placeholder.objects.create(slot="test")
+        add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        self.run_commit_hooks()
+        site_id = Site.objects.get_current().pk
+        get_page_tree(site_id, "en")
+        get_page_tree(site_id, "fr")
+
+        # Run
+        create_page(
+            "Depth 3 page 4",
+            "simple.html",
+            "en",
+            parent=self.depth2_page2,
+            published=True,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.run_commit_hooks()
+
+        # Check
+        title_queries = [
+            query["sql"] for query in queries if Title._meta.db_table in query["sql"]
+        ]
+        assert len(title_queries) == 2
+        path = get_node(self.depth2_page2.get_public_object()).path
+        assert all(path + "%" in sql for sql in title_queries)
+
+    def test_does_not_prewarm_sitemaps_depending_on_permissions(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_PREWARM = "sync"
+        settings.HTMLSITEMAP_VIEW_PERMISSIONS = True
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        site = Site.objects.get_current()
+
+        # Run
+        self.depth2_page3.unpublish("en")
+        with CaptureQueriesContext(connection) as queries:
+            self.run_commit_hooks()
+
+        # Check
+        assert len(queries) == 0
+        assert get_cached_sitemap(model_instance, site.pk, "en")[1] is None
+
+    @pytest.mark.django_db(transaction=True)
+    def test_can_prewarm_cached_sitemaps_in_a_background_thread(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        site = Site.objects.get_current()
+
+        # Run
+        start_prewarm_thread(site.pk).join()
+
+        # Check
+        version, pages = get_cached_sitemap(model_instance, site.pk, "en")
+        assert pages == get_entry_list(
+            get_annotated_entries(model_instance, site, "en")
+        )
+
+    def test_can_render_the_descendants_of_a_root_page(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder,
+            cms_plugins.HtmlSitemapPlugin,
+            "en",
+            root_page=self.depth2_page2,
+        )
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            html = self.render_plugin(model_instance)
+        html = strip_spaces_between_tags(html)
+
+        # Check
+        assert html.strip() == strip_spaces_between_tags(
+            """
+            <div id="sitemap">
+                <ul>
+                    <li><a href="/depth-2-page-2/depth-3-page-1/" title="Depth 3 page 1">Depth 3 page 1</a></li>
+                    <li><a href="/depth-2-page-2/depth-3-page-2/" title="Depth 3 page 2">Depth 3 page 2</a></li>
+                </ul>
+            </div>
+        """
+        ).strip()
+        # Only the branch of the root page is read.
+        assert any("LIKE" in query["sql"] for query in queries)
+
+    def test_can_render_the_section_of_the_current_page(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", section_depth=2
+        )
+
+        # Run
+        self.request.current_page = self.depth3_page1.publisher_public
+        depth2_page2_html = self.render_plugin(model_instance)
+        self.request.current_page = self.depth2_page4.publisher_public
+        depth2_page4_html = self.render_plugin(model_instance)
+
+        # Check
+        assert "Depth 3 page 1" in depth2_page2_html
+        assert "Depth 3 page 3" not in depth2_page2_html
+        assert "Depth 3 page 1" not in depth2_page4_html
+        assert "Depth 3 page 3" in depth2_page4_html
+
+    def test_renders_the_section_of_each_page_displaying_a_placeholder(
+        self, settings
+    ):
+        # Setup
+        settings.CMS_PLACEHOLDER_CACHE = True
+        placeholder = Placeholder.objects.create(slot="footer")
+        add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en", section_depth=2)
+        self.request.user = AnonymousUser()
+        self.request.current_page = self.depth3_page1.publisher_public
+        depth2_page2_html = self.render_placeholder(placeholder)
+
+        # Run
+        self.request = self.get_request()
+        self.request.user = AnonymousUser()
+        self.request.current_page = self.depth2_page4.publisher_public
+        depth2_page4_html = self.render_placeholder(placeholder)
+
+        # Check
+        assert "Depth 3 page 1" in depth2_page2_html
+        assert "Depth 3 page 1" not in depth2_page4_html
+        assert "Depth 3 page 3" in depth2_page4_html
+
+    def test_can_render_the_descendants_of_a_root_page_from_the_menu_nodes(
+        self, settings
+    ):
+        # Setup
+        settings.HTMLSITEMAP_MENU_NODES = True
+        self.request.user = AnonymousUser()
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder,
+            cms_plugins.HtmlSitemapPlugin,
+            "en",
+            root_page=self.depth2_page2,
+        )
+
+        # Run
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert html.count("<a href=") == 2
+        assert "Depth 3 page 1" in html
+        assert "Depth 3 page 2" in html
+
+    @pytest.mark.parametrize(
+        "options", [{"root_page": "depth2_page2"}, {"section_depth": 2}]
+    )
+    def test_can_render_the_descendants_of_a_root_from_the_draft_menu_nodes(
+        self, settings, options
+    ):
+        # Setup
+        settings.HTMLSITEMAP_MENU_NODES = True
+        self.request.user = self.user
+        # The menu of the toolbar of editors is built from the draft pages.
+        self.request.current_page = self.depth3_page1
+        placeholder = Placeholder.objects.create(slot="test")
+        if "root_page" in options:
+            options = {"root_page": getattr(self, options["root_page"])}
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", **options
+        )
+
+        # Run
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert html.count("<a href=") == 2
+        assert "Depth 3 page 1" in html
+        assert "Depth 3 page 2" in html
+
+    def test_selects_the_root_page_among_the_pages_of_the_cms(self):
+        # Run
+        form_field = cms_plugins.HtmlSitemapPlugin.model._meta.get_field(
+            "root_page"
+        ).formfield()
+
+        # Check
+        assert isinstance(form_field, PageSelectFormField)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_can_create_and_drop_the_indexes_of_the_sitemap_queries(self):
+        # Setup
+        index_names = {index.name for model, index in get_sitemap_indexes()}
+
+        # Run & check
+        call_command("create_htmlsitemap_indexes", stdout=StringIO())
+        assert index_names <= get_existing_index_names()
+        call_command("create_htmlsitemap_indexes", "--drop", stdout=StringIO())
+        assert not index_names & get_existing_index_names()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_can_check_the_indexes_of_the_sitemap_queries(self):
+        # Setup
+        call_command("create_htmlsitemap_indexes", stdout=StringIO())
+        stdout = StringIO()
+
+        # Run
+        try:
+            call_command("check_htmlsitemap_indexes", "--plans", stdout=stdout)
+        finally:
+            call_command("create_htmlsitemap_indexes", "--drop", stdout=StringIO())
+
+        # Check
+        output = stdout.getvalue()
+        for model, index in get_sitemap_indexes():
+            assert "{0} on {1}: ".format(index.name, model._meta.db_table) in output
+        assert "missing" not in output
+
+    def test_can_serve_a_sitemap_built_by_the_build_command(self, settings, tmpdir):
+        # Setup
+        settings.HTMLSITEMAP_STATIC_DIR = str(tmpdir)
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", max_depth=2
+        )
+        expected_html = self.render_plugin(model_instance)
+        call_command("build_htmlsitemaps", "--jobs", "1", stdout=StringIO())
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            html = self.render_plugin(model_instance)
+
+        # Check
+        assert html == expected_html
+        assert not any(Title._meta.db_table in query["sql"] for query in queries)
+
+    def test_does_not_serve_a_built_sitemap_after_a_change_of_the_page_tree(
+        self, settings, tmpdir
+    ):
+        # Setup
+        settings.HTMLSITEMAP_STATIC_DIR = str(tmpdir)
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        call_command("build_htmlsitemaps", "--jobs", "1", stdout=StringIO())
+
+        # Run
+        create_page(
+            "Depth 3 page 4",
+            "simple.html",
+            "en",
+            parent=self.depth2_page2,
+            published=True,
+        )
+        self.run_commit_hooks()
+        html = self.render_plugin(model_instance)
+
+        # Check
+        assert "Depth 3 page 4" in html
+
+    @pytest.mark.parametrize("snapshots", [False, True])
+    def test_can_build_the_page_trees_of_several_sites_and_languages(
+        self, settings, snapshots
+    ):
+        # Setup
+        other_site = Site.objects.create(domain="example.org", name="example.org")
+        create_page(
+            "Other site page", "simple.html", "en", published=True, site=other_site
+        )
+        create_title("fr", "Index fr", self.index_page)
+        create_title("fr", "Niveau 2 Page 1", self.depth2_page1)
+        publish_page(self.index_page, self.user, "fr")
+        publish_page(self.depth2_page1, self.user, "fr")
+        settings.HTMLSITEMAP_SNAPSHOTS = snapshots
+        call_command("refresh_htmlsitemap_snapshots", stdout=StringIO())
+        site_id = Site.objects.get_current().pk
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            trees = get_page_trees(
+                [(site_id, "en"), (site_id, "fr"), (other_site.pk, "en")]
+            )
+
+        # Check
+        assert len(queries) == 1
+        assert trees[site_id, "en"] == get_page_tree(site_id, "en")
+        assert [title for url, title, path, depth, _ in trees[site_id, "en"]] == [
+            "Index",
+            "Depth 2 page 1",
+            "Depth 2 page 2",
+            "Depth 3 page 1",
+            "Depth 3 page 2",
+            "Depth 2 page 3",
+            "Depth 2 page 4",
+            "Depth 3 page 3",
+        ]
+        assert [title for url, title, path, depth, _ in trees[site_id, "fr"]] == [
+            "Index fr",
+            "Niveau 2 Page 1",
+        ]
+        assert [title for url, title, path, depth, _ in trees[other_site.pk, "en"]] == [
+            "Other site page"
+        ]
+
+    def test_can_assemble_the_page_tree_from_cached_branches(self, settings):
+        # Setup
+        site_id = Site.objects.get_current().pk
+        expected_tree = get_page_tree(site_id, "en")
+        settings.HTMLSITEMAP_BRANCH_DEPTH = 2
+
+        # Run
+        tree = get_page_tree(site_id, "en")
+        with CaptureQueriesContext(connection) as queries:
+            cached_tree = get_page_tree(site_id, "en")
+
+        # Check
+        assert tree == expected_tree
+        assert cached_tree == expected_tree
+        assert not any(Title._meta.db_table in query["sql"] for query in queries)
+
+    def test_only_reads_the_changed_branch_of_the_page_tree_again(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_BRANCH_DEPTH = 2
+        site_id = Site.objects.get_current().pk
+        get_page_tree(site_id, "en")
+        create_page(
+            "Depth 3 page 4",
+            "simple.html",
+            "en",
+            parent=self.depth2_page2,
+            published=True,
+        )
+        self.run_commit_hooks()
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            tree = get_page_tree(site_id, "en")
+
+        # Check
+        settings.HTMLSITEMAP_BRANCH_DEPTH = None
+        assert tree == get_page_tree(site_id, "en")
+        assert "Depth 3 page 4" in [title for url, title, path, depth, _ in tree]
+        title_queries = [
+            query["sql"] for query in queries if Title._meta.db_table in query["sql"]
+        ]
+        assert len(title_queries) == 1
+        path = get_node(self.depth2_page2.get_public_object()).path
+        assert path + "%" in title_queries[0]
+
+    @pytest.mark.parametrize("published", [True, False])
+    def test_keeps_the_cached_branches_when_their_roots_are_renumbered(
+        self, settings, published
+    ):
+        # Setup
+        settings.HTMLSITEMAP_BRANCH_DEPTH = 2
+        site_id = Site.objects.get_current().pk
+        get_page_tree(site_id, "en")
+
+        # Run
+        # Inserting the page renumbers the paths of its next siblings.
+        create_page(
+            "Depth 2 page 0",
+            "simple.html",
+            "en",
+            parent=self.index_page,
+            position="first-child",
+            published=published,
+        )
+        tree = get_page_tree(site_id, "en")
+
+        # Check
+        settings.HTMLSITEMAP_BRANCH_DEPTH = None
+        assert tree == get_page_tree(site_id, "en")
+
+    def test_can_render_the_pages_the_user_can_view(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_VIEW_PERMISSIONS = True
+        settings.CMS_PERMISSION = True
+        create_page(
+            "Private page",
+            "simple.html",
+            "en",
+            login_required=True,
+            published=True,
+            parent=self.index_page,
+        )
+        restricted_page = create_page(
+            "Restricted page",
+            "simple.html",
+            "en",
+            published=True,
+            parent=self.index_page,
+        )
+        group = Group.objects.create(name="Intranet")
+        PagePermission.objects.create(
+            page=restricted_page, group=group, can_view=True, grant_on=ACCESS_PAGE
+        )
+        member = User.objects.create(username="member")
+        member.groups.add(group)
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+
+        # Run
+        html = {}
+        for user in [AnonymousUser(), User.objects.create(username="other"), member]:
+            self.request = self.get_request()
+            self.request.user = user
+            html[user.username] = self.render_plugin(model_instance)
+
+        # Check
+        assert "Depth 2 page 1" in html[""]
+        assert "Private page" not in html[""]
+        assert "Restricted page" not in html[""]
+        assert "Private page" in html["other"]
+        assert "Restricted page" not in html["other"]
+        assert "Private page" in html["member"]
+        assert "Restricted page" in html["member"]
+
+    @pytest.mark.parametrize("setting", ["VIEW_PERMISSIONS", "MENU_NODES"])
+    def test_does_not_share_sitemaps_depending_on_the_user_between_users(
+        self, settings, setting
+    ):
+        # Setup
+        settings.CMS_PLACEHOLDER_CACHE = True
+        settings.CMS_PERMISSION = True
+        settings.HTMLSITEMAP_VIEW_PERMISSIONS = setting == "VIEW_PERMISSIONS"
+        settings.HTMLSITEMAP_MENU_NODES = setting == "MENU_NODES"
+        restricted_page = create_page(
+            "Restricted page",
+            "simple.html",
+            "en",
+            published=True,
+            parent=self.index_page,
+        )
+        group = Group.objects.create(name="Intranet")
+        PagePermission.objects.create(
+            page=restricted_page, group=group, can_view=True, grant_on=ACCESS_PAGE
+        )
+        member = User.objects.create(username="member")
+        member.groups.add(group)
+        placeholder = Placeholder.objects.create(slot="test")
+        add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        self.request.user = member
+        member_html = self.render_placeholder(placeholder)
+
+        # Run
+        self.request = self.get_request()
+        self.request.user = AnonymousUser()
+        html = self.render_placeholder(placeholder)
+
+        # Check
+        assert "Restricted page" in member_html
+        assert "Restricted page" not in html
+
+    def test_shares_the_sitemaps_of_users_having_the_same_groups(self, settings):
+        # Setup
+        settings.HTMLSITEMAP_VIEW_PERMISSIONS = True
+        group = Group.objects.create(name="Intranet")
+        users = [
+            User.objects.create(username="user1"),
+            User.objects.create(username="user2"),
+        ]
+        for user in users:
+            user.groups.add(group)
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        self.request.user = users[0]
+        expected_html = self.render_plugin(model_instance)
+
+        # Run
+        self.request = self.get_request()
+        self.request.user = users[1]
+        with CaptureQueriesContext(connection) as queries:
+            html = self.render_plugin(model_instance)
+
+        # Check
+        assert html == expected_html
+        assert not any(Title._meta.db_table in query["sql"] for query in queries)
+
+    @pytest.mark.parametrize("extra_pages", [0, 20])
+    def test_reads_the_page_tree_with_a_single_query(self, extra_pages):
+        # Setup
+        for i in range(extra_pages):
+            create_page(
+                "Depth 3 extra page {0}".format(i),
+                "simple.html",
+                "en",
+                parent=self.depth2_page1,
+                published=True,
+            )
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            tree = get_page_tree(Site.objects.get_current().pk, "en")
+
+        # Check
+        assert len(queries) == 1
+        paths = [path for url, title, path, depth, in_navigation in tree]
+        assert len(paths) == 8 + extra_pages
+        assert paths == sorted(paths)
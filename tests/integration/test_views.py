@@ -0,0 +1,574 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import unicode_literals
+
+import json
+import re
+from calendar import timegm
+from datetime import timedelta
+from xml.etree import ElementTree
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import strip_spaces_between_tags
+from django.utils.http import http_date, parse_http_date
+from django.utils.six import StringIO
+
+import pytest
+from cms.api import add_plugin, create_page
+from cms.models import Page, Placeholder
+from djangocms_htmlsitemap import cms_plugins
+from djangocms_htmlsitemap.tree import get_node
+
+from .base import CMSPagesTestMixin
+
+
+@pytest.mark.django_db
+class TestSitemapView(CMSPagesTestMixin):
+    @pytest.mark.parametrize("snapshots", [False, True])
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {},
+            {"min_depth": 2, "max_depth": 2},
+            {"in_navigation": True},
+            {"lazy_levels": 1},
+            {"in_navigation": True, "lazy_levels": 1},
+        ],
+    )
+    def test_renders_the_same_html_as_the_plugin(
+        self, client, settings, options, snapshots
+    ):
+        # Setup
+        settings.HTMLSITEMAP_SNAPSHOTS = snapshots
+        call_command("refresh_htmlsitemap_snapshots", stdout=StringIO())
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", **options
+        )
+
+        # Run
+        response = client.get(
+            reverse("djangocms_htmlsitemap:sitemap", args=[model_instance.pk])
+        )
+
+        # Check
+        assert response.status_code == 200
+        assert response.content.decode("utf-8") == self.render_plugin(model_instance)
+
+    def test_renders_the_templates_overridden_by_the_project(
+        self, client, settings, tmpdir
+    ):
+        # Setup
+        tmpdir.mkdir("djangocms_htmlsitemap").join("sitemap.html").write(
+            "{% for entry in pages %}{{ entry.title }};{% endfor %}"
+        )
+        settings.TEMPLATES = [dict(settings.TEMPLATES[0], DIRS=[str(tmpdir)])]
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", min_depth=3
+        )
+
+        # Run
+        response = client.get(
+            reverse("djangocms_htmlsitemap:sitemap", args=[model_instance.pk])
+        )
+
+        # Check
+        assert response.content == b"Depth 3 page 1;Depth 3 page 2;Depth 3 page 3;"
+
+    def test_renders_the_menu_nodes(self, client, settings):
+        # Setup
+        settings.HTMLSITEMAP_MENU_NODES = True
+        settings.MIDDLEWARE = [
+            "django.contrib.sessions.middleware.SessionMiddleware",
+            "django.contrib.auth.middleware.AuthenticationMiddleware",
+        ]
+        self.request.user = AnonymousUser()
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", min_depth=2
+        )
+
+        # Run
+        response = client.get(
+            reverse("djangocms_htmlsitemap:sitemap", args=[model_instance.pk])
+        )
+
+        # Check
+        assert response.content.decode("utf-8") == self.render_plugin(model_instance)
+
+    def test_caches_the_rendered_fragments(self, client):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        url = reverse("djangocms_htmlsitemap:sitemap", args=[model_instance.pk])
+        expected_content = client.get(url).content
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+
+        # Check
+        assert response.content == expected_content
+        # The plugin instance and the modification date of the pages are the
+        # only values read from the database.
+        assert len(queries) == 2
+
+    def test_renders_fragments_again_once_the_tree_has_changed(self, client):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        url = reverse("djangocms_htmlsitemap:sitemap", args=[model_instance.pk])
+        client.get(url)
+
+        # Run
+        self.depth2_page3.unpublish("en")
+        self.run_commit_hooks()
+        response = client.get(url)
+
+        # Check
+        assert b"Depth 2 page 1" in response.content
+        assert b"Depth 2 page 3" not in response.content
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {},
+            {"min_depth": 2},
+            {"max_depth": 2},
+            {"min_depth": 2, "max_depth": 2},
+            {"in_navigation": True},
+            {"in_navigation": False},
+        ],
+    )
+    def test_streams_the_same_html_as_the_plugin(self, client, settings, options):
+        # Setup
+        settings.HTMLSITEMAP_STREAM_CHUNK_SIZE = 3
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", **options
+        )
+
+        # Run
+        response = client.get(
+            reverse("djangocms_htmlsitemap:sitemap_stream", args=[model_instance.pk])
+        )
+
+        # Check
+        assert response.status_code == 200
+        assert response.streaming
+        assert b"".join(response.streaming_content).decode(
+            "utf-8"
+        ) == self.render_plugin(model_instance)
+
+    def test_streams_the_descendants_of_a_root_page(self, client):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder,
+            cms_plugins.HtmlSitemapPlugin,
+            "en",
+            root_page=self.depth2_page2,
+        )
+
+        # Run
+        response = client.get(
+            reverse("djangocms_htmlsitemap:sitemap_stream", args=[model_instance.pk])
+        )
+
+        # Check
+        assert b"".join(response.streaming_content).decode(
+            "utf-8"
+        ) == self.render_plugin(model_instance)
+
+    def test_loads_the_titles_of_the_pages_by_chunks(self, client, settings):
+        # Setup
+        settings.HTMLSITEMAP_STREAM_CHUNK_SIZE = 3
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        response = client.get(
+            reverse("djangocms_htmlsitemap:sitemap_stream", args=[model_instance.pk])
+        )
+
+        # Run
+        with CaptureQueriesContext(connection) as queries:
+            content = b"".join(response.streaming_content)
+
+        # Check
+        assert content.count(b"<a href=") == 8
+        assert (
+            len([query for query in queries if "cms_title" in query["sql"]])
+            == 3 + 1  # One query per chunk plus the one of the pages
+        )
+
+    def test_returns_a_404_for_unknown_plugins(self, client):
+        response = client.get(reverse("djangocms_htmlsitemap:sitemap", args=[42]))
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize("name", ["sitemap", "sitemap_stream", "sitemap_json"])
+    def test_returns_a_404_for_the_sections_of_the_current_page(self, client, name):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", section_depth=2
+        )
+
+        # Run
+        response = client.get(
+            reverse("djangocms_htmlsitemap:" + name, args=[model_instance.pk])
+        )
+
+        # Check
+        assert response.status_code == 404
+
+    def test_streams_the_entries_of_the_sitemap_as_json(self, client):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", min_depth=2
+        )
+
+        # Run
+        response = client.get(
+            reverse("djangocms_htmlsitemap:sitemap_json", args=[model_instance.pk])
+        )
+
+        # Check
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/json"
+        entries = json.loads(b"".join(response.streaming_content).decode("utf-8"))
+        assert entries[0] == {
+            "url": "/depth-2-page-1/",
+            "title": "Depth 2 page 1",
+            "path": get_node(self.depth2_page1.get_public_object()).path,
+            "depth": 2,
+            "level": 0,
+        }
+        assert [(entry["title"], entry["level"]) for entry in entries] == [
+            ("Depth 2 page 1", 0),
+            ("Depth 2 page 2", 0),
+            ("Depth 3 page 1", 1),
+            ("Depth 3 page 2", 1),
+            ("Depth 2 page 3", 0),
+            ("Depth 2 page 4", 0),
+            ("Depth 3 page 3", 1),
+        ]
+
+    def test_can_export_the_sitemap_as_json(self):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        stdout = StringIO()
+
+        # Run
+        call_command("export_htmlsitemap", str(model_instance.pk), stdout=stdout)
+
+        # Check
+        entries = json.loads(stdout.getvalue())
+        assert len(entries) == 8
+        assert entries[0]["title"] == "Index"
+
+    def test_can_export_the_sitemap_as_xml(self, tmpdir):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(placeholder, cms_plugins.HtmlSitemapPlugin, "en")
+        output = str(tmpdir.join("sitemap.xml"))
+
+        # Run
+        call_command(
+            "export_htmlsitemap",
+            str(model_instance.pk),
+            "--format",
+            "xml",
+            "--output",
+            output,
+        )
+
+        # Check
+        root = ElementTree.parse(output).getroot()
+        assert len(list(root.iter("page"))) == 8
+        index = root.find("pages/page")
+        assert index.get("title") == "Index"
+        assert [page.get("title") for page in index.findall("pages/page")] == [
+            "Depth 2 page 1",
+            "Depth 2 page 2",
+            "Depth 2 page 3",
+            "Depth 2 page 4",
+        ]
+        depth2_page2 = index.findall("pages/page")[1]
+        assert [page.get("url") for page in depth2_page2.findall("pages/page")] == [
+            "/depth-2-page-2/depth-3-page-1/",
+            "/depth-2-page-2/depth-3-page-2/",
+        ]
+
+
+@pytest.mark.django_db
+class TestSubtreeView(CMSPagesTestMixin):
+    def test_renders_the_next_levels_below_a_node(self, client):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", lazy_levels=1
+        )
+
+        # Run
+        response = client.get(
+            reverse(
+                "djangocms_htmlsitemap:subtree",
+                args=[
+                    model_instance.pk,
+                    get_node(self.index_page.get_public_object()).path,
+                ],
+            )
+        )
+
+        # Check
+        assert response.status_code == 200
+        html = strip_spaces_between_tags(response.content.decode("utf-8"))
+        assert html.strip() == strip_spaces_between_tags(
+            """
+            <ul>
+                <li><a href="/depth-2-page-1/" title="Depth 2 page 1">Depth 2 page 1</a></li>
+                <li>
+                    <a href="/depth-2-page-2/" title="Depth 2 page 2">Depth 2 page 2</a><div data-htmlsitemap-subtree="{0}"></div>
+                </li>
+                <li><a href="/depth-2-page-3/" title="Depth 2 page 3">Depth 2 page 3</a></li>
+                <li>
+                    <a href="/depth-2-page-4/" title="Depth 2 page 4">Depth 2 page 4</a><div data-htmlsitemap-subtree="{1}"></div>
+                </li>
+            </ul>
+        """.format(
+                reverse(
+                    "djangocms_htmlsitemap:subtree",
+                    args=[
+                        model_instance.pk,
+                        get_node(self.depth2_page2.get_public_object()).path,
+                    ],
+                ),
+                reverse(
+                    "djangocms_htmlsitemap:subtree",
+                    args=[
+                        model_instance.pk,
+                        get_node(self.depth2_page4.get_public_object()).path,
+                    ],
+                ),
+            )
+        ).strip()
+
+    def test_renders_leaves_without_placeholders_for_their_subtrees(self, client):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", lazy_levels=1
+        )
+
+        # Run
+        response = client.get(
+            reverse(
+                "djangocms_htmlsitemap:subtree",
+                args=[
+                    model_instance.pk,
+                    get_node(self.depth2_page2.get_public_object()).path,
+                ],
+            )
+        )
+
+        # Check
+        html = response.content.decode("utf-8")
+        assert html.count("<a href=") == 2
+        assert "data-htmlsitemap-subtree" not in html
+
+    @pytest.mark.parametrize("snapshots", [False, True])
+    def test_renders_the_pages_listed_below_pages_that_are_filtered_out(
+        self, client, settings, snapshots
+    ):
+        # Setup
+        settings.HTMLSITEMAP_SNAPSHOTS = snapshots
+        create_page(
+            "Depth 4 page 1",
+            "simple.html",
+            "en",
+            in_navigation=True,
+            published=True,
+            parent=self.depth3_page1,
+        )
+        call_command("refresh_htmlsitemap_snapshots", stdout=StringIO())
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder,
+            cms_plugins.HtmlSitemapPlugin,
+            "en",
+            in_navigation=True,
+            lazy_levels=1,
+        )
+        html = self.render_plugin(model_instance)
+
+        # Run
+        fragments = []
+        subtree_urls = re.findall(r'data-htmlsitemap-subtree="([^"]+)"', html)
+        while subtree_urls:
+            fragment = client.get(subtree_urls.pop()).content.decode("utf-8")
+            subtree_urls.extend(
+                re.findall(r'data-htmlsitemap-subtree="([^"]+)"', fragment)
+            )
+            fragments.append(fragment)
+
+        # Check
+        assert "Depth 4 page 1" not in html
+        assert len(fragments) == 1
+        assert "Depth 2 page 1" in fragments[0]
+        assert "Depth 4 page 1" in fragments[0]
+
+    def test_renders_the_next_levels_below_a_menu_node(self, client, settings):
+        # Setup
+        settings.HTMLSITEMAP_MENU_NODES = True
+        # Menus depend on the user of the request.
+        settings.MIDDLEWARE = [
+            "django.contrib.sessions.middleware.SessionMiddleware",
+            "django.contrib.auth.middleware.AuthenticationMiddleware",
+        ]
+        self.request.user = AnonymousUser()
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", lazy_levels=2
+        )
+        html = self.render_plugin(model_instance)
+        subtree_url = re.search(r'data-htmlsitemap-subtree="([^"]+)"', html).group(1)
+
+        # Run
+        response = client.get(subtree_url)
+
+        # Check
+        assert response.status_code == 200
+        html = strip_spaces_between_tags(response.content.decode("utf-8"))
+        assert html.strip() == strip_spaces_between_tags(
+            """
+            <ul>
+                <li><a href="/depth-2-page-2/depth-3-page-1/" title="Depth 3 page 1">Depth 3 page 1</a></li>
+                <li><a href="/depth-2-page-2/depth-3-page-2/" title="Depth 3 page 2">Depth 3 page 2</a></li>
+            </ul>
+        """
+        ).strip()
+
+    def test_renders_the_same_fragment_with_the_fast_renderer(self, client, settings):
+        # Setup
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en", lazy_levels=1
+        )
+        url = reverse(
+            "djangocms_htmlsitemap:subtree",
+            args=[
+                model_instance.pk,
+                get_node(self.index_page.get_public_object()).path,
+            ],
+        )
+        expected_content = client.get(url).content
+        settings.HTMLSITEMAP_FAST_RENDERER = True
+
+        # Run
+        response = client.get(url)
+
+        # Check
+        assert response.status_code == 200
+        assert response.content == expected_content
+
+
+@pytest.mark.django_db
+class TestConditionalFragments(CMSPagesTestMixin):
+    @pytest.fixture(autouse=True)
+    def setup_plugin(self, setup_cms):
+        placeholder = Placeholder.objects.create(slot="test")
+        self.model_instance = add_plugin(
+            placeholder, cms_plugins.HtmlSitemapPlugin, "en"
+        )
+        self.url = reverse(
+            "djangocms_htmlsitemap:sitemap", args=[self.model_instance.pk]
+        )
+
+    def test_sends_validators_with_sitemap_fragments(self, client):
+        response = client.get(self.url)
+        assert response.status_code == 200
+        assert response["ETag"]
+        assert response["Last-Modified"]
+        assert "Cache-Control" not in response
+
+    def test_answers_conditional_requests_with_304_responses(self, client):
+        # Setup
+        response = client.get(self.url)
+
+        # Run
+        etag_response = client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        date_response = client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+
+        # Check
+        assert etag_response.status_code == 304
+        assert date_response.status_code == 304
+
+    def test_changes_the_etag_of_fragments_when_a_page_is_unpublished(self, client):
+        # Setup
+        response = client.get(self.url)
+
+        # Run
+        self.depth2_page3.unpublish("en")
+        self.run_commit_hooks()
+        new_response = client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+        # Check
+        assert new_response.status_code == 200
+        assert new_response["ETag"] != response["ETag"]
+
+    def test_can_send_a_cache_control_header(self, client, settings):
+        settings.HTMLSITEMAP_FRAGMENT_MAX_AGE = 600
+        response = client.get(self.url)
+        assert response["Cache-Control"] == "public, max-age=600"
+
+    def test_moves_the_modification_date_forward_when_a_page_is_unpublished(
+        self, client
+    ):
+        # Setup
+        Page.objects.update(changed_date=timezone.now() - timedelta(days=1))
+        response = client.get(self.url)
+
+        # Run
+        self.depth2_page3.unpublish("en")
+        self.run_commit_hooks()
+        new_response = client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+
+        # Check
+        assert new_response.status_code == 200
+        assert parse_http_date(new_response["Last-Modified"]) > parse_http_date(
+            response["Last-Modified"]
+        )
+
+    def test_only_considers_the_listed_pages_for_the_modification_date(self, client):
+        # Setup
+        last_week = timezone.now() - timedelta(days=7)
+        Page.objects.update(changed_date=last_week)
+        Page.objects.filter(pk=self.depth2_page1.publisher_public_id).update(
+            changed_date=timezone.now()
+        )
+        placeholder = Placeholder.objects.create(slot="test")
+        model_instance = add_plugin(
+            placeholder,
+            cms_plugins.HtmlSitemapPlugin,
+            "en",
+            root_page=self.depth2_page2,
+        )
+
+        # Run
+        response = client.get(
+            reverse("djangocms_htmlsitemap:sitemap", args=[model_instance.pk])
+        )
+
+        # Check
+        assert response["Last-Modified"] == http_date(timegm(last_week.utctimetuple()))
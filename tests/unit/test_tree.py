@@ -0,0 +1,191 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import unicode_literals
+
+import pickle
+
+import pytest
+from cms.models import Page
+from djangocms_htmlsitemap.compat import DJANGO_CMS_35
+from djangocms_htmlsitemap.tree import (
+    AnnotatedEntries,
+    SitemapEntry,
+    TreeNode,
+    TreeProvider,
+    iter_annotated,
+    iter_annotated_entries,
+)
+from treebeard.models import Node
+
+
+class FakeNode(object):
+    def __init__(self, path):
+        self.path = path
+
+    def get_depth(self):
+        return len(self.path) // 4
+
+
+def get_nodes(*paths):
+    return [FakeNode(path) for path in paths]
+
+
+def render(annotated):
+    html = ""
+    for node, info in annotated:
+        html += "<ul><li>" if info["open"] else "</li><li>"
+        html += node.path
+        html += "</li></ul>" * len(info["close"])
+    return html
+
+
+class TestIterAnnotated(object):
+    @pytest.mark.parametrize(
+        "paths",
+        [
+            ["0001"],
+            ["0001", "00010001", "00010002", "000100020001", "00010003"],
+            ["00010001", "000100010001", "00010002", "000100020001"],
+            ["0001", "00010001", "000100010001", "0002"],
+        ],
+    )
+    def test_gives_the_same_result_as_treebeard_for_complete_trees(self, paths):
+        nodes = get_nodes(*paths)
+        assert list(
+            iter_annotated((node, node.path) for node in nodes)
+        ) == Node.get_annotated_list_qs(nodes)
+
+    def test_nests_items_under_their_closest_listed_ancestor(self):
+        nodes = get_nodes("0001", "000100010001", "00010002")
+        html = render(iter_annotated((node, node.path) for node in nodes))
+        assert html == (
+            "<ul><li>0001"
+            "<ul><li>000100010001</li><li>00010002</li></ul>"
+            "</li></ul>"
+        )
+
+    def test_does_not_nest_items_under_listed_items_that_are_not_ancestors(self):
+        nodes = get_nodes("0001", "000100010001", "0001000200010001")
+        html = render(iter_annotated((node, node.path) for node in nodes))
+        assert html == (
+            "<ul><li>0001"
+            "<ul><li>000100010001</li><li>0001000200010001</li></ul>"
+            "</li></ul>"
+        )
+
+    def test_keeps_the_markup_balanced_when_going_back_above_the_first_item(self):
+        nodes = get_nodes("000100010001", "00010002")
+        html = render(iter_annotated((node, node.path) for node in nodes))
+        assert html == "<ul><li>000100010001</li><li>00010002</li></ul>"
+
+    def test_is_lazy(self):
+        def items():
+            yield "first", "0001"
+            yield "second", "00010001"
+            raise AssertionError("The third item should not be read")
+
+        annotated = iter_annotated(items())
+        assert next(annotated)[0] == "first"
+
+    def test_returns_nothing_for_empty_trees(self):
+        assert list(iter_annotated([])) == []
+
+
+class TestIterAnnotatedEntries(object):
+    def test_annotates_the_entries_like_iter_annotated(self):
+        paths = ["0001", "00010001", "000100010001", "00010002", "0002"]
+        entries = [SitemapEntry("/", "Title", path, len(path) // 4) for path in paths]
+
+        annotated = list(iter_annotated_entries(entries))
+
+        expected = iter_annotated((entry, entry.path) for entry in entries)
+        for (entry, info), (expected_entry, expected_info) in zip(annotated, expected):
+            assert entry is info is expected_entry
+            assert info.open == expected_info["open"]
+            assert list(info.close) == expected_info["close"]
+
+    def test_entries_can_be_pickled(self):
+        entry = SitemapEntry("/", "Title", "0001", 1)
+        entry.close_count = 1
+        entry.subtree_url = "/sitemap/1/0001/"
+
+        assert pickle.loads(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)) == entry
+
+    def test_entries_stand_for_pages_in_templates(self):
+        entry = SitemapEntry("/page/", "Title", "0001", 1)
+
+        assert entry.get_absolute_url() == "/page/"
+        assert "{0}".format(entry) == "Title"
+
+
+class TestAnnotatedEntries(object):
+    def test_gives_the_same_tuples_as_iter_annotated_entries(self):
+        paths = ["0001", "00010001", "0002"]
+        entries = [SitemapEntry("/", "Title", path, len(path) // 4) for path in paths]
+        annotated = list(iter_annotated_entries(entries))
+
+        annotated_entries = AnnotatedEntries(entries)
+
+        assert len(annotated_entries) == 3
+        assert annotated_entries == annotated
+        assert annotated_entries[1] == annotated[1]
+        assert list(reversed(annotated_entries)) == annotated[::-1]
+
+    def test_shares_the_list_of_entries(self):
+        entries = [SitemapEntry("/", "Title", "0001", 1)]
+
+        annotated_entries = AnnotatedEntries(entries)
+
+        assert annotated_entries.entries is entries
+        entry, info = annotated_entries[0]
+        assert entry is info is entries[0]
+
+
+# Both layouts of the page tree can only be checked with django CMS 3.5+.
+shared_nodes = pytest.mark.skipif(
+    not DJANGO_CMS_35, reason="Tree nodes are shared since django CMS 3.5"
+)
+
+
+class TestTreeProvider(object):
+    @pytest.mark.parametrize(
+        "node_field, columns",
+        [
+            pytest.param(
+                "node", ("node__site", "node__path", "node__depth"), marks=shared_nodes
+            ),
+            (None, ("site", "path", "depth")),
+        ],
+    )
+    def test_gives_the_columns_of_the_page_tree(self, node_field, columns):
+        # Run
+        provider = TreeProvider(node_field)
+
+        # Check
+        assert provider.node_model is (TreeNode if node_field else Page)
+        assert (
+            provider.site_column,
+            provider.path_column,
+            provider.depth_column,
+        ) == columns
+
+    @pytest.mark.parametrize(
+        "node_field", [pytest.param("node", marks=shared_nodes), None]
+    )
+    def test_gives_the_tree_node_of_a_page(self, node_field):
+        # Setup
+        page = Page(node=TreeNode(path="0001")) if node_field else Page()
+
+        # Run & check
+        node = TreeProvider(node_field).get_node(page)
+        assert node is (page.node if node_field else page)
+
+    @pytest.mark.parametrize(
+        "node_field", [pytest.param("node", marks=shared_nodes), None]
+    )
+    def test_selects_the_tree_nodes_of_pages(self, node_field):
+        # Run
+        pages = TreeProvider(node_field).select_nodes(Page.objects.all())
+
+        # Check
+        assert pages.query.select_related == ({"node": {}} if node_field else False)